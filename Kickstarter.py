@@ -28,6 +28,15 @@ from math import pi
 import random
 import seaborn as sns
 
+from chartdata import bar_data, line_data, pie_data
+from cleaning import clean_kickstarter, empty_name
+from crosstab import state_category_crosstab
+from encoding import DimensionRegistry
+from figures import bar_figure
+from loader import ANALYSIS_COLUMNS, INSPECTED_COLUMNS, load_kickstarter
+from nullprofile import NullProfile
+from sparsegrid import SparseGrid
+
 
 # ## 1. Read CSV file and then load into a data frame
 
@@ -35,7 +44,8 @@ import seaborn as sns
 
 
 #path= r"kickstarter_data_full.csv"
-initdf= pd.read_csv('kickstarter_data_full.csv')
+# Only the columns used below are parsed, with compact dtypes (see loader.SCHEMA)
+initdf= load_kickstarter('kickstarter_data_full.csv', usecols=ANALYSIS_COLUMNS + INSPECTED_COLUMNS)
 # initdf
 
 
@@ -62,7 +72,9 @@ initdf.info()
 
 # VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 
-print([col for col in initdf.columns if initdf[col].isnull().any()])
+# One scan builds the null counts/bitmaps of every column; the checks below read from it
+null_profile = NullProfile.from_frame(initdf)
+print(null_profile.columns_with_nulls())
 
 
 # #### After running the above fucntion, we found out the columns with missing values to handle them.  
@@ -76,7 +88,7 @@ print([col for col in initdf.columns if initdf[col].isnull().any()])
 
 #Checking rows for which specified column contains null
 def nonnullcheck(df, col):
-    return df[col][df[col].notna()]
+    return null_profile.non_nulls(df, col)
 
 
 # In[6]:
@@ -84,69 +96,40 @@ def nonnullcheck(df, col):
 
 # function to check column values of null values 
 def nullcheck(df, col):
-    return df[col][df[col].isna()]
+    return null_profile.nulls(df, col)
 
 #insert the column name for which you wish to check
 nullcheck(initdf,'blurb_len_clean') 
 
 
-# 
+# #### Missing blurbs are filled with "Missing blurb" and their lengths with 0 (rules in cleaning.CLEANING_RULES).
 
 # In[7]:
 
 
-#Handling blurb
-initdf["blurb"].fillna("Missing blurb", inplace=True)
-initdf["blurb_len"].fillna(0, inplace=True)
-initdf["blurb_len_clean"].fillna(0, inplace=True)
-
-
-# In[8]:
-
-
-# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
-initdf[['blurb','blurb_len','blurb_len_clean']]
-
-
-# In[9]:
-
-
 # Checking null rows for location
 nullcheck(initdf,'location')
 
 
-# In[10]:
-
-
-# HANDLING LOCATION NULL VALUES
-# Replacing the Null values in location column with "No Location Specified"
-initdf["location"].fillna("No location specified", inplace=True)
-
-
-# In[11]:
-
-
-# Chekcing 'name', 'location' and 'country' for rows which has unspecified location
-initdf[['name', 'location', 'country']][initdf['location'] == "No location specified"]
-
+# #### Null values in the location column are replaced with "No location specified".
 
 # #### Checking null values in columns: 'is_starred', friends', 'permissions' &'is_backing'.
 
-# In[12]:
+# In[8]:
 
 
 #Checing the Non-null Values and evaluating their impact. 
 nonnullcheck(initdf, 'is_backing')
 
 
-# In[13]:
+# In[9]:
 
 
 #Checing the Non-null Values and evaluating their impact. 
 nonnullcheck(initdf, 'is_starred')
 
 
-# In[14]:
+# In[10]:
 
 
 #Checing the Non-null Values and evaluating their impact. 
@@ -154,7 +137,7 @@ nonnullcheck(initdf, 'is_starred')
 nonnullcheck(initdf, 'friends')
 
 
-# In[15]:
+# In[11]:
 
 
 #Checing the Non-null Values and evaluating their impact. 
@@ -162,32 +145,16 @@ nonnullcheck(initdf, 'friends')
 nonnullcheck(initdf, 'permissions')
 
 
-# ### DROPPING UNNECESSARY COLUMNS
-# 
-
-# In[16]:
-
-
-# Since the maximum values columns 'friends', 'is_starred', 'is_backing'& 'permissions' is either Null or inserted by the author which will also not affect out visualisations, we will drop these four columns.
-
-initdf.drop(['friends', 'is_starred', 'is_backing', 'permissions'], inplace=True, axis=1)
-
-
-# In[17]:
-
-
-# To get the look of new Dataframe
-initdf.info()
-
+# #### Since the maximum values columns 'friends', 'is_starred', 'is_backing'& 'permissions' is either Null or inserted by the author which will also not affect out visualisations, we will drop these four columns.
 
-# In[18]:
+# In[12]:
 
 
 # VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 nullcheck(initdf, 'category')
 
 
-# In[19]:
+# In[13]:
 
 
 # VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
@@ -195,72 +162,80 @@ nullcheck(initdf, 'category')
 nonnullcheck(initdf, 'category')
 
 
-# In[20]:
+# #### For all the Null values in categories, we are grouping them and assigning them the value "Uncategorized" for a cleaner outlay of the dataset.
 
+# In[14]:
 
-#For all the Null values in categories, we are grouping them and assigning them a value for a cleaner outlay of the dataset.
 
-initdf[['name','category']][initdf['category']=="Uncategorized"]
+# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 
 
-# In[21]:
+nullcheck(initdf, 'name_len')
 
 
-# Handling categories
-initdf["category"].fillna("Uncategorized", inplace=True)
+# In[15]:
 
 
-# In[22]:
+# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 
+# Rows without a name are incomplete and get dropped by the cleaning rules
+initdf[['name','name_len','name_len_clean']][empty_name(initdf)]
 
-# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 
-#check if all null values have been handled
-print([col for col in initdf.columns if initdf[col].isnull().any()])
+# ### APPLYING THE CLEANING RULES
+# 
 
+# In[16]:
 
-# In[23]:
 
+# Fills, column drops and incomplete-row drops are declared once in cleaning.CLEANING_RULES
+# and applied in a single stage (the same stage is used for cached and streamed data).
+initdf = clean_kickstarter(initdf, profile=null_profile)
 
-# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
+
+# In[17]:
 
 
-nonnullcheck(initdf, 'name_len')
+# To get the look of new Dataframe
+initdf.info()
 
 
-# In[24]:
+# In[18]:
 
 
 # VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
+initdf[['blurb','blurb_len','blurb_len_clean']]
 
 
-nullcheck(initdf, 'name_len')
+# In[19]:
 
 
-# In[25]:
+# Chekcing 'name', 'location' and 'country' for rows which has unspecified location
+initdf[['name', 'location', 'country']][initdf['location'] == "No location specified"]
 
 
-# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
+# In[20]:
 
 
-initdf[['name','name_len','name_len_clean']][initdf['name_len']==0.0]
+initdf[['name','category']][initdf['category']=="Uncategorized"]
 
 
-# In[26]:
+# In[21]:
 
 
-# DROPPING INCOMPLETE DATA ROWS
+# VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 
-initdf.drop(labels=[1411,6744,9239,11708,14805], axis=0, inplace=True)
+#check if all null values have been handled
+print(null_profile.columns_with_nulls())
 
 
-# In[27]:
+# In[22]:
 
 
 # VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 # Checking for Null values in Dataframe
 
-initdf.isnull().values.any()
+null_profile.any()
 
 
 # ## VALIDATION TEST CELLS 
@@ -308,67 +283,29 @@ initdf.isnull().values.any()
 # initdf["category"].unique()
 
 
-# ### CREATING DATAFRAMES BY STATE
-# 
-
-# In[33]:
-
-
-failed_df = initdf[initdf["state"] == "failed"].groupby(["category"])[['state']].count().reset_index()
-successful_df = initdf[initdf["state"] == "successful"].groupby(["category"])[['state']].count().reset_index()
-canceled_df = initdf[initdf["state"] == "canceled"].groupby(["category"])[['state']].count().reset_index()
-live_df = initdf[initdf["state"] == "live"].groupby(["category"])[['state']].count().reset_index()
-suspended_df = initdf[initdf["state"] == "suspended"].groupby(["category"])[['state']].count().reset_index()
-
-
-# ### CREATING DEFAULT DICTIONARY FOR STATES
+# ### CREATING DIMENSION CODES FOR CATEGORIES AND STATES
 
 # In[34]:
 
 
 
 
-categories_dict = {
-    'Academic':0,
-    'Places':0,
-    'Uncategorized':0,
-    'Blues':0,
-    'Restaurants':0,
-    'Webseries':0, 
-    'Thrillers':0, 
-    'Shorts':0, 
-    'Web':0, 
-    'Apps':0, 
-    'Gadgets':0,
-    'Hardware':0, 
-    'Festivals':0, 
-    'Plays':0, 
-    'Musical':0, 
-    'Flight':0, 
-    'Spaces':0,
-    'Immersive':0, 
-    'Experimental':0, 
-    'Comedy':0, 
-    'Wearables':0, 
-    'Sound':0,
-    'Software':0, 
-    'Robots':0, 
-    'Makerspaces':0
-}
+# Integer codes of category/state/country/location; categories missing from
+# the chart order (encoding.CATEGORIES) are appended, not dropped
+registry = DimensionRegistry()
+
 
+# ### CREATING STATE X CATEGORY COUNTS
 
 # In[35]:
 
 
-#    METHOD TO RETURN SERIES PER STATE FOR VISUALIZATION
-def populating_state_series(df):
+# One pass over the category/state codes gives the counts of every state per category
+crosstab = state_category_crosstab(initdf, registry)
 
-    shallow_copy = categories_dict.copy()
-    for i in range(len(df)):
-        if df['category'][i] in shallow_copy:
-            shallow_copy[df['category'][i]] = df['state'][i]
-#     print(shallow_copy)
-    return list(shallow_copy.values())
+#    METHOD TO RETURN SERIES PER STATE FOR VISUALIZATION
+def populating_state_series(state):
+    return crosstab.column(state).tolist()
 
 
 # In[36]:
@@ -376,7 +313,7 @@ def populating_state_series(df):
 
 # VALIDATION TEST CELL -------------------------------------------------------------------------------------------------
 
-# categories_dict
+# registry['category'].labels
 
 
 # In[37]:
@@ -384,12 +321,12 @@ def populating_state_series(df):
 
 # CALLING METHOD TO RETURN SERIES PER STATE FOR VISUALIZATION
 
-categories = list(categories_dict.keys())
-failed = populating_state_series(failed_df)
-successful = populating_state_series(successful_df)
-canceled = populating_state_series(canceled_df)
-live = populating_state_series(live_df)
-suspended = populating_state_series(suspended_df)
+categories = crosstab.categories
+failed = populating_state_series('failed')
+successful = populating_state_series('successful')
+canceled = populating_state_series('canceled')
+live = populating_state_series('live')
+suspended = populating_state_series('suspended')
 
 
 # In[38]:
@@ -426,37 +363,13 @@ suspended = populating_state_series(suspended_df)
 
 from bokeh.plotting import figure, show
 from bokeh.plotting import show, output_notebook, output_file
+from bokeh.models import ColumnDataSource
 output_notebook()
 
-categories = list(categories_dict.keys())
-states = list(initdf["state"].unique())
-colors = ["orange", "red", "green","blue", "silver"]
-
-data = {'categories' : categories}
-data['failed'] = populating_state_series(failed_df)
-data['successful'] = populating_state_series(successful_df) 
-data['canceled'] = populating_state_series(canceled_df)
-data['live'] = populating_state_series(live_df)
-data['suspended'] = populating_state_series(suspended_df)
- 
-
-# print(data)
-p = figure(x_range=categories, height=500, title="States of Kicstarter by Categories",
-           toolbar_location=None, tools='hover', tooltips="$name @categories: @$name")
-
-p.vbar_stack(states, x='categories', width=0.9, color=colors, source=data,
-             legend_label=states)
-
-p.y_range.start = 0
-p.x_range.range_padding = 0.1
-p.xgrid.grid_line_color = None
-p.axis.minor_tick_line_color = None
-p.outline_line_color = None
-p.legend.location = "top_left"
-p.legend.orientation = "horizontal"
-p.xaxis.major_label_orientation = "vertical"
-p.xaxis.axis_label = 'Categories'
-p.yaxis.axis_label = 'No.of Kickstarters'
+# categories plus one NumPy count array per state (serialized as binary, not JSON lists);
+# the figure is the same one the report and the dashboard draw (see figures.py)
+data = ColumnDataSource(bar_data(crosstab))
+p = bar_figure(data, crosstab.categories, crosstab.states)
 
 
 show(p)
@@ -498,14 +411,8 @@ show(p)
 
 # METHOD TO RETURN Categories PER STATE FOR VISUALIZATION
 
-def populating_categories_dictionary(df):
-    shallow_copy = categories_dict.copy()
-    for i in range(len(df)):
-        if df['category'][i] in shallow_copy:
-            shallow_copy[df['category'][i]] = df['state'][i]
-#             shallow_copy['academic'] = 20
-#     print(shallow_copy)
-    return shallow_copy
+def populating_categories_dictionary(crosstab):
+    return crosstab.as_dict()
 
 
 # ## 4.2 PIE CHART
@@ -519,43 +426,24 @@ from bokeh.io import output_notebook, show
 from bokeh.palettes import Category20c
 import random
 from bokeh.plotting import figure
-from bokeh.transform import cumsum
 from bokeh.models import LabelSet, ColumnDataSource
 
 output_notebook()
 
-pie_colors=['#039d72','#45BA7E','#de324c', '#f4895f', '#f8e16f',
-            '#95cf92','#369acc','#9656a2','#B74E09','#61B22E',
-            '#4B2DF7','#5EB999','#5DBDE7','#DD629B','#B2A6A3',
-            '#C9212C','#E63DC4', '#A13C50','#4E4327','#76A9CA',
-            '#DD7C03','#DD7C03','#80D077','#D84CE4', '#D67956']
-
-
-total_df = initdf.groupby("category")["state"].count().reset_index()
-x = populating_categories_dictionary(total_df)
-data = pd.Series(x).reset_index(name='value').rename(columns={'index':'category'})
-# print(data)
 
-data['angle'] = data['value']/data['value'].sum() * 2*pi
-data['color'] = ['#039d72','#45BA7E','#de324c', '#f4895f', '#f8e16f',
-            '#95cf92','#369acc','#9656a2','#B74E09','#61B22E',
-            '#4B2DF7','#5EB999','#5DBDE7','#DD629B','#B2A6A3',
-            '#C9212C','#E63DC4', '#A13C50','#4E4327','#76A9CA',
-            '#DD7C03','#DD7C03','#80D077','#D84CE4', '#D67956']
+x = populating_categories_dictionary(crosstab)
+# wedge angles, colors and label positions are precomputed from the category totals
+source = ColumnDataSource(pie_data(list(x.keys()), list(x.values())))
 
-p = figure(plot_height=800, title="Pie Chart", toolbar_location=None,
+p = figure(height=800, title="Pie Chart", toolbar_location=None,
            tools="hover", tooltips="@category: @value", x_range=(-0.8, 1.8))
 
 p.wedge(x=0, y=1, radius=0.8,
-        start_angle=cumsum('angle', include_zero=True), end_angle=cumsum('angle'),
-        line_color="white", fill_color='color', legend='category', source=data)
+        start_angle='start_angle', end_angle='end_angle',
+        line_color="white", fill_color='color', legend_field='category', source=source)
 
-data["value"] = data['value'].astype(str)
-data["value"] = data["value"].str.pad(35, side = "left")
-source = ColumnDataSource(data)
-
-labels = LabelSet(x=0, y=1, text='value',
-        angle=cumsum('angle', include_zero=True), source=source, render_mode='canvas')
+labels = LabelSet(x='label_x', y='label_y', text='value', text_align='center',
+        text_font_size='8pt', source=source)
 
 p.add_layout(labels)
 
@@ -585,9 +473,16 @@ show(p)
 # In[43]:
 
 
+# Counts per launch year are taken from the cleaned initdf; only the year column of the matching rows is read
+def count_by_year(state=None):
+    years = initdf['launched_at_yr']
+    if state is not None:
+        years = years[initdf['state'] == state]
+    return years.value_counts().sort_index()
+
 # Using Groupby, Checking count of kickstarter(name) by their launch year which have state as successful. 
 
-initdf[initdf['state'] == 'successful'].groupby('launched_at_yr')['name'].count()
+count_by_year('successful')
 
 
 # In[44]:
@@ -595,7 +490,7 @@ initdf[initdf['state'] == 'successful'].groupby('launched_at_yr')['name'].count(
 
 # Using Groupby, Checking count of kickstarter(name) by their launch year which have state as Failed. 
 
-initdf[initdf['state'] == 'failed'].groupby('launched_at_yr')['name'].count()
+count_by_year('failed')
 
 
 # In[45]:
@@ -604,20 +499,20 @@ initdf[initdf['state'] == 'failed'].groupby('launched_at_yr')['name'].count()
 # CALLING METHOD TO RETURN SERIES PER Launch Year  FOR VISUALIZATION
 
 # This method will call all the kickstarters according to their launch year.
-total_by_yr = initdf.groupby(['launched_at_yr'])[['name']].count().reset_index()
+total_by_yr = count_by_year()
 
 # This method will call all the sucessful kickstarters according to their launch year.
-successful_by_yr = initdf[initdf['state'] == 'successful'].groupby('launched_at_yr')['name'].count().reset_index()
+successful_by_yr = count_by_year('successful')
 
 # This method will call all the failed kickstarters according to their launch year.
-failed_by_yr = initdf[initdf['state'] == 'failed'].groupby('launched_at_yr')['name'].count().reset_index()
+failed_by_yr = count_by_year('failed')
 
 
 # In[46]:
 
 
 # VALIDATION TEST CELL ------------------------------------------------------------------------------------------------
-#list(successful_by_yr['name'])
+#successful_by_yr
 
 
 # ## 4.3 LINE GRAPH
@@ -626,19 +521,16 @@ failed_by_yr = initdf[initdf['state'] == 'failed'].groupby('launched_at_yr')['na
 
 
 from bokeh.plotting import figure, show
-# prepare some data
-x = list(total_by_yr['launched_at_yr']) #list of years
-y1 = list(total_by_yr['name']) #count(name/anything) for total by year 
-y2 = list(failed_by_yr['name']) #count(name/anything) for failed by year 
-y3 = list(successful_by_yr['name']) #count(name/anything) for successful by year 
+# prepare some data: years and total/failed/successful counts aligned on the same years
+source = ColumnDataSource(line_data(total_by_yr, failed_by_yr, successful_by_yr))
 
 # create a new plot with a title and axis labels
-p = figure(title="Total campaign vs Success/Failure rate", x_axis_label="Year", y_axis_label="Value", plot_width = 600, plot_height = 400)
+p = figure(title="Total campaign vs Success/Failure rate", x_axis_label="Year", y_axis_label="Value", width = 600, height = 400)
 
 # add multiple renderers
-p.line(x, y1, legend_label="Total.", color="blue", line_width=2)
-p.line(x, y2, legend_label="Failed", color="red", line_width=2)
-p.line(x, y3, legend_label="Successful", color="green", line_width=2)
+p.line('year', 'total', source=source, legend_label="Total.", color="blue", line_width=2)
+p.line('year', 'failed', source=source, legend_label="Failed", color="red", line_width=2)
+p.line('year', 'successful', source=source, legend_label="Successful", color="green", line_width=2)
 # show the results
 
 
@@ -659,7 +551,9 @@ show(p)
 # In[48]:
 
 
-pivot_table= initdf.pivot_table(index="category",columns="country",values="backers_count",aggfunc='mean')
+# Sums and counts of the occupied cells only (see sparsegrid.py), densified for the plot
+backers_grid = SparseGrid.from_frame(initdf, 'category', 'country', 'backers_count', registry)
+pivot_table = backers_grid.mean_frame()
 color = plt.get_cmap('RdYlGn') 
 color.set_bad('maroon')
 sns.heatmap(pivot_table,cmap=color)
@@ -699,11 +593,11 @@ plt.ylabel('Number of Campaigns')
 # In[50]:
 
 
-initdf['usd_goal'] = initdf['goal']*initdf['static_usd_rate'] # To convert currency of goal to US currency
-boxdf = initdf[['category','SuccessfulBool', 'state', 'launch_to_deadline_days']]
-boxdf.groupby(initdf.category).mean().reset_index()
-failed = boxdf[boxdf['SuccessfulBool']==0][['launch_to_deadline_days','category' ,'state']]
-success = boxdf[boxdf['SuccessfulBool']==1][['launch_to_deadline_days','category','state']]
+# usd_goal (goal converted to US currency) is added by the loader, see currency.py
+# Only the rows and columns a plot needs are taken from initdf
+box_columns = ['launch_to_deadline_days','category','state']
+failed = initdf.loc[initdf['SuccessfulBool'] == 0, box_columns]
+success = initdf.loc[initdf['SuccessfulBool'] == 1, box_columns]
 x = failed['launch_to_deadline_days']
 y = failed['category']
 sns.set(rc={'figure.figsize':(15,6)})
@@ -724,15 +618,16 @@ plt.savefig('boxplot.png')
 # In[51]:
 
 
-scatterdf = initdf[['usd_goal','category','usd_pledged','SuccessfulBool', 'state','backers_count']]
-# filtering the failed projects 
-failed = scatterdf[scatterdf['SuccessfulBool']==0][['usd_goal','backers_count','category' ,'usd_pledged','state']]
-# filtering the successful projects
-success = scatterdf[scatterdf['SuccessfulBool']==1][['usd_goal','backers_count','category' ,'usd_pledged','state']]
+def category_means(successful):
+    # Per-category means of the failed (0) or successful (1) projects in initdf
+    rows = initdf.loc[initdf['SuccessfulBool'] == successful,
+                      ['category', 'usd_goal', 'backers_count', 'usd_pledged']]
+    return rows.groupby('category', observed=True).mean().reset_index()
+
 sns.set(font_scale=1.3)
 #Extracting average values for all categories
-avg1 = failed.groupby(initdf.category).mean().reset_index()
-avg2 = success.groupby(initdf.category).mean().reset_index()
+avg1 = category_means(0)
+avg2 = category_means(1)
 fig, ax = plt.subplots()
 sns.scatterplot(avg1['usd_goal'],avg1['category'], size = avg1['backers_count'], color='r', label='failed')
 sns.scatterplot(avg2['usd_goal'],avg2['category'], size = avg2['backers_count'], color='g', label='successful')
@@ -0,0 +1,249 @@
+"""Benchmarks of every analysis stage on synthetic Kickstarter data.
+
+    python bench.py                               # 20k, 1M and 10M rows
+    python bench.py --sizes 20000 --label quick
+    python bench.py --compare baseline candidate  # ratios between two labelled runs
+
+``synthetic_frame`` generates campaigns with the schema of the typed loader:
+categories of ``encoding.CATEGORIES``, the five states, a US-heavy country
+mix, log-normal goals, zero-inflated heavy-tailed backers, plus the nulls and
+empty names the cleaning rules deal with.  The frame is written to a CSV once
+per size and seed (under ``bench_data/``) and reused by later runs.
+
+Every size runs the stages twice: once timed with ``perf_counter`` and no
+tracing, then once more under ``tracemalloc`` for the peak allocation of each
+stage, so the tracing overhead does not inflate the timings.  One JSON line
+per (size, stage) is appended to the results file so runs with different
+labels can be compared.
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean_kickstarter
+from crosstab import state_category_crosstab
+from encoding import CATEGORIES, STATES
+from incremental import AGGREGATES, Aggregates
+from loader import ANALYSIS_COLUMNS, INSPECTED_COLUMNS, load_kickstarter
+from nullprofile import NullProfile
+from report import box_stats
+from sketch import QuantileSketches
+
+
+SIZES = [20000, 1000000, 10000000]
+DATA_DIR = 'bench_data'
+RESULTS_PATH = 'bench_results.jsonl'
+
+STATE_WEIGHTS = [0.55, 0.30, 0.10, 0.04, 0.01]
+COUNTRIES = ['US', 'GB', 'CA', 'AU', 'DE', 'NL', 'FR', 'IT', 'ES', 'SE',
+             'DK', 'NZ', 'IE', 'CH', 'NO', 'BE', 'AT', 'LU', 'HK', 'SG', 'MX', 'CN']
+COUNTRY_WEIGHTS = np.array([60, 10, 5, 4, 3] + [1] * 17, dtype=float)
+CURRENCIES = {'US': 'USD', 'GB': 'GBP', 'CA': 'CAD', 'AU': 'AUD', 'NZ': 'NZD',
+              'DK': 'DKK', 'SE': 'SEK', 'NO': 'NOK', 'CH': 'CHF', 'HK': 'HKD',
+              'SG': 'SGD', 'MX': 'MXN', 'CN': 'CNY'}
+USD_RATES = {'USD': 1.0, 'GBP': 1.25, 'CAD': 0.76, 'AUD': 0.76, 'NZD': 0.72,
+             'DKK': 0.14, 'SEK': 0.11, 'NOK': 0.12, 'CHF': 1.0, 'HKD': 0.13,
+             'SGD': 0.70, 'MXN': 0.05, 'CNY': 0.15, 'EUR': 1.07}
+
+LAUNCH_START = np.datetime64('2009-04-21T00:00:00')
+LAUNCH_END = np.datetime64('2017-02-01T00:00:00')
+
+
+def _timestamps(values):
+    return np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ')
+
+
+def synthetic_frame(n, seed=0):
+    """``n`` synthetic campaigns with the columns of ``loader`` (raw, before cleaning)."""
+    rng = np.random.default_rng(seed)
+    span = int((LAUNCH_END - LAUNCH_START) / np.timedelta64(1, 's'))
+    launched = LAUNCH_START + rng.integers(0, span, n).astype('timedelta64[s]')
+    duration = rng.choice([30, 30, 30, 45, 60, 15, 20, 40], n) + rng.integers(-3, 4, n)
+    duration = np.clip(duration, 1, 92)
+    deadline = launched + (duration * 86400).astype('timedelta64[s]')
+    created_before = rng.integers(3600, 90 * 86400, n).astype('timedelta64[s]')
+
+    # Category popularity follows a Zipf-like curve.
+    category_weights = 1.0 / np.arange(1, len(CATEGORIES) + 1)
+    category = rng.choice(CATEGORIES, n, p=category_weights / category_weights.sum())
+    state = rng.choice(STATES, n, p=STATE_WEIGHTS)
+    country = rng.choice(COUNTRIES, n, p=COUNTRY_WEIGHTS / COUNTRY_WEIGHTS.sum())
+    currency = pd.Series(country).map(CURRENCIES).fillna('EUR').to_numpy()
+    rate = pd.Series(currency).map(USD_RATES).to_numpy()
+
+    goal = np.round(rng.lognormal(9.0, 1.6, n), -1) + 100
+    backers = np.where(rng.random(n) < 0.25, 0, rng.pareto(1.2, n) * 15).astype(np.int64)
+    pledged = backers * rng.lognormal(4.0, 0.8, n)
+    ids = rng.choice(2 ** 31 - 1, n, replace=False)
+    names = pd.Series(ids).astype(str).radd('Project ')
+    name_len = rng.integers(1, 12, n).astype(float)
+    name_len[rng.random(n) < 0.0003] = 0.0
+    locations = pd.Series(rng.integers(0, 2000, n)).astype(str).radd('City ') + ', ' + country
+
+    df = pd.DataFrame({
+        'id': ids,
+        'name': names,
+        'blurb': 'A new campaign looking for backers',
+        'goal': goal,
+        'pledged': pledged,
+        'state': state,
+        'country': country,
+        'currency': currency,
+        'backers_count': backers,
+        'static_usd_rate': rate,
+        'usd_pledged': pledged * rate,
+        'location': locations,
+        'category': category,
+        'name_len': name_len,
+        'name_len_clean': np.maximum(name_len - 1, 0),
+        'blurb_len': 6.0,
+        'blurb_len_clean': 5.0,
+        'launched_at': _timestamps(launched),
+        'deadline': _timestamps(deadline),
+        'created_at': _timestamps(launched - created_before),
+        'state_changed_at': _timestamps(deadline),
+        'launched_at_yr': launched.astype('datetime64[Y]').astype(int) + 1970,
+        'launched_at_month': launched.astype('datetime64[M]').astype(int) % 12 + 1,
+        'launch_to_deadline_days': duration,
+        'SuccessfulBool': (state == 'successful').astype(int),
+    })
+    for col in INSPECTED_COLUMNS:
+        df[col] = np.nan
+    missing_blurb = rng.random(n) < 0.01
+    df.loc[missing_blurb, ['blurb', 'blurb_len', 'blurb_len_clean']] = np.nan
+    df.loc[rng.random(n) < 0.02, 'location'] = np.nan
+    df.loc[rng.random(n) < 0.03, 'category'] = np.nan
+    return df
+
+
+def synthetic_csv(n, seed=0, data_dir=DATA_DIR):
+    """Path of a synthetic CSV with ``n`` rows, generated on first use."""
+    path = os.path.join(data_dir, 'synthetic-%d-%d.csv' % (n, seed))
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        synthetic_frame(n, seed).to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def _aggregate(name):
+    return {name: AGGREGATES[name]}
+
+
+def stages(path):
+    """Stage functions in pipeline order; each reads and extends a shared context dict."""
+    def csv_load(ctx):
+        ctx['raw'] = load_kickstarter(path, usecols=ANALYSIS_COLUMNS + INSPECTED_COLUMNS)
+        return ctx['raw']
+
+    def null_profile(ctx):
+        ctx['profile'] = NullProfile.from_frame(ctx['raw'])
+        return ctx['raw']
+
+    def cleaning(ctx):
+        ctx['df'] = clean_kickstarter(ctx.pop('raw'), profile=ctx['profile'])
+        return ctx['df']
+
+    def state_crosstab(ctx):
+        ctx['crosstab'] = state_category_crosstab(ctx['df'])
+        return ctx['df']
+
+    def pie_totals(ctx):
+        ctx['pie'] = ctx['crosstab'].as_dict()
+        return ctx['df']
+
+    def yearly_counts(ctx):
+        Aggregates.from_frame(ctx['df'], _aggregate('year_state')).yearly_counts()
+        return ctx['df']
+
+    def heatmap_pivot(ctx):
+        aggregates = Aggregates.from_frame(ctx['df'], _aggregate('country_category_backers'))
+        aggregates.backers_mean_pivot()
+        return ctx['df']
+
+    def usd_goal_box_scatter(ctx):
+        aggregates = Aggregates.from_frame(ctx['df'], {name: AGGREGATES[name]
+                                                for name in ['category_outcome', 'duration']})
+        aggregates.category_means(0)
+        box_stats(aggregates.duration_counts(0))
+        return ctx['df']
+
+    def goal_medians(ctx):
+        sketches = QuantileSketches.from_frame(ctx['df'])
+        for successful in (0, 1):
+            sketches.combined('usd_goal', successful).quantile(0.5)
+        return ctx['df']
+
+    return [csv_load, null_profile, cleaning, state_crosstab, pie_totals,
+            yearly_counts, heatmap_pivot, usd_goal_box_scatter, goal_medians]
+
+
+def _run_stages(path, traced):
+    # (name, seconds, peak bytes or None, rows out) of every stage, on a fresh context.
+    ctx = {}
+    results = []
+    for stage in stages(path):
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        out = stage(ctx)
+        seconds = time.perf_counter() - start
+        peak = None
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append((stage.__name__, seconds, peak, len(out)))
+    return results
+
+
+def run(sizes=SIZES, label='run', results_path=RESULTS_PATH, seed=0):
+    """Benchmark every stage at every size; return and append the result records."""
+    records = []
+    for n in sizes:
+        path = synthetic_csv(n, seed)
+        timed = _run_stages(path, traced=False)
+        traced = _run_stages(path, traced=True)
+        for (name, seconds, _, rows_out), (_, _, peak, _) in zip(timed, traced):
+            record = {'label': label, 'rows': n, 'stage': name,
+                      'seconds': round(seconds, 6), 'peak_mb': round(peak / 2 ** 20, 3),
+                      'rows_out': rows_out, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            records.append(record)
+            print('%9d %-22s %9.3f s %10.1f MB' % (n, name, seconds, record['peak_mb']))
+    with open(results_path, 'a') as fh:
+        for record in records:
+            fh.write(json.dumps(record) + '\n')
+    return records
+
+
+def compare(baseline, candidate, results_path=RESULTS_PATH):
+    """Candidate/baseline time and memory ratios per (rows, stage), latest record of each label."""
+    results = pd.read_json(results_path, lines=True)
+    latest = results.groupby(['label', 'rows', 'stage']).last()
+    base = latest.loc[baseline]
+    cand = latest.loc[candidate]
+    ratios = pd.DataFrame({'time_ratio': cand['seconds'] / base['seconds'],
+                           'memory_ratio': cand['peak_mb'] / base['peak_mb']})
+    return ratios.dropna()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Kickstarter pipeline stages')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--label', default='run', help='name of this run in the results file')
+    parser.add_argument('--results', default=RESULTS_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'))
+    args = parser.parse_args(argv)
+    if args.compare:
+        print(compare(args.compare[0], args.compare[1], args.results).to_string())
+    else:
+        run(args.sizes, args.label, args.results, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Persistent columnar cache of the cleaned Kickstarter frame.
+
+The cleaned frame is written as an uncompressed Feather (Arrow IPC) file so a
+warm start is a memory-mapped read instead of a CSV parse plus the cleaning
+passes.  Entries are keyed on the SHA-256 of the source CSV, the cleaning
+pipeline version and the selected columns; a change to any of them rebuilds
+the entry.  The source digest itself is memoised against the file's size and
+mtime, so an unchanged CSV is not re-hashed on every start.
+
+The dimension columns are stored with the integer codes of the shared
+``encoding.DimensionRegistry``, whose code tables live next to the entries.
+"""
+import hashlib
+import json
+import os
+
+import pyarrow as pa
+from pyarrow import feather
+
+from cleaning import CLEANING_VERSION, clean_kickstarter
+from encoding import REGISTRY_FILE, DimensionRegistry
+from instrument import stage
+from loader import ANALYSIS_COLUMNS, CSV_PATH, load_kickstarter
+
+
+CACHE_DIR = '.kickstarter_cache'
+
+# Rows per Arrow record batch in the Feather files; the unit ``query`` prunes.
+BATCH_ROWS = 65536
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 hex digest of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_json(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(obj, fh)
+    os.replace(tmp, path)
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def source_digest(path, cache_dir=CACHE_DIR):
+    """Content digest of ``path``, re-hashed only when its size or mtime changed."""
+    stat = os.stat(path)
+    memo_path = os.path.join(cache_dir, _stem(path) + '.source.json')
+    memo = read_json(memo_path)
+    if memo and memo['size'] == stat.st_size and memo['mtime_ns'] == stat.st_mtime_ns:
+        return memo['digest']
+
+    digest = file_digest(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_json(memo_path, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest})
+    return digest
+
+
+def _entry_key(digest, usecols):
+    columns = 'all' if usecols is None else ','.join(usecols)
+    raw = '%s:%s:%s' % (digest, CLEANING_VERSION, columns)
+    return hashlib.sha256(raw.encode()).hexdigest()[:20]
+
+
+def cache_key(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR):
+    """Version key of the cleaned frame built from ``path``."""
+    return _entry_key(source_digest(path, cache_dir), usecols)
+
+
+def entry_path(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR):
+    """Path prefix of the cache entry for ``path``; artifacts derived from the
+    cleaned frame are stored under it (``entry + suffix``) and pruned with it.
+    """
+    return os.path.join(cache_dir, '%s-%s' % (_stem(path), cache_key(path, usecols, cache_dir)))
+
+
+def load_registry(cache_dir=CACHE_DIR):
+    """The dimension code tables saved in ``cache_dir`` (seeded if there are none yet)."""
+    return DimensionRegistry.load(os.path.join(cache_dir, REGISTRY_FILE))
+
+
+def write_columnar(df, path):
+    """Write ``df`` (index and categoricals included) as uncompressed Feather
+    in record batches of ``BATCH_ROWS`` rows.
+    """
+    table = pa.Table.from_pandas(df)
+    tmp = path + '.tmp'
+    feather.write_feather(table, tmp, compression='uncompressed', chunksize=BATCH_ROWS)
+    os.replace(tmp, path)
+
+
+def read_columnar(path, columns=None):
+    """Memory-mapped read of a Feather file written by ``write_columnar``."""
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def clean_entry(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR):
+    """Path prefix of the current cache entry for ``path``, built first if needed.
+
+    The cleaned frame is at ``entry + '.feather'``.
+    """
+    digest = source_digest(path, cache_dir)
+    entry = entry_path(path, usecols, cache_dir)
+    if not os.path.exists(entry + '.feather'):
+        with stage('read_csv') as s:
+            df = load_kickstarter(path, usecols=usecols)
+            s.rows_out = len(df)
+        with stage('clean', rows_in=len(df)) as s:
+            df = clean_kickstarter(df)
+            s.rows_out = len(df)
+        registry = load_registry(cache_dir)
+        registry.encode_frame(df)
+        registry.save(os.path.join(cache_dir, REGISTRY_FILE))
+        with stage('cache_write', rows_in=len(df)):
+            write_columnar(df, entry + '.feather')
+        write_json(entry + '.json', {
+            'source': os.path.abspath(path),
+            'digest': digest,
+            'cleaning_version': CLEANING_VERSION,
+            'columns': list(df.columns),
+            'rows': len(df),
+        })
+        _prune(cache_dir, _stem(path), digest)
+    return entry
+
+
+def artifact_entry(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR):
+    """``entry_path`` for artifacts computed straight from the CSV (e.g. streamed results).
+
+    The cleaned frame is not built, but the entry's metadata is written so
+    the artifacts are pruned with it once ``path`` or the pipeline changes,
+    and the entries of older versions of ``path`` are pruned now.
+    """
+    digest = source_digest(path, cache_dir)
+    entry = entry_path(path, usecols, cache_dir)
+    if read_json(entry + '.json') is None:
+        write_json(entry + '.json', {
+            'source': os.path.abspath(path),
+            'digest': digest,
+            'cleaning_version': CLEANING_VERSION,
+        })
+        _prune(cache_dir, _stem(path), digest)
+    return entry
+
+
+def load_clean_frame(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR,
+                     columns=None):
+    """Cleaned frame for ``path``, served from the cache when it is current.
+
+    ``columns`` narrows what is read back from the cache; the cache entry
+    itself always holds every column in ``usecols``.
+    """
+    entry = clean_entry(path, usecols, cache_dir)
+    with stage('cache_read') as s:
+        df = read_columnar(entry + '.feather', columns=columns)
+        s.rows_out = len(df)
+    return df
+
+
+def _prune(cache_dir, stem, digest):
+    # Entries built from an older source or pipeline version can never be hit again.
+    for name in os.listdir(cache_dir):
+        if not (name.startswith(stem + '-') and name.endswith('.json')):
+            continue
+        entry = os.path.join(cache_dir, name[:-len('.json')])
+        if '.' in os.path.basename(entry)[len(stem) + 1:]:
+            # A JSON artifact of an entry (e.g. query's ``.stats.json``), not its metadata.
+            continue
+        meta = read_json(entry + '.json')
+        if meta and meta['digest'] == digest and meta['cleaning_version'] == CLEANING_VERSION:
+            continue
+        prefix = os.path.basename(entry) + '.'
+        for artifact in os.listdir(cache_dir):
+            if artifact.startswith(prefix):
+                os.remove(os.path.join(cache_dir, artifact))
@@ -0,0 +1,206 @@
+"""NumPy-backed Bokeh data sources for the Kickstarter charts.
+
+Bokeh serialises NumPy numeric columns as binary buffers, while Python lists
+are written element by element as JSON.  Everything here therefore hands
+``ColumnDataSource`` NumPy arrays (int32/float64, which Bokeh encodes
+natively) and precomputes the geometry the charts need, e.g. the pie label
+positions instead of space-padded label strings.
+
+Long daily series are reduced with min/max decimation before they reach the
+browser: each bucket keeps its lowest and highest point, which preserves the
+visual envelope of the line at a fraction of the points.
+
+``patches`` diffs a source's current columns against new ones, so a live
+document (the server dashboard) ships only the values that changed.
+
+Bokeh itself is only imported once a source is built, so the column builders
+can be used by jobs that never render.
+"""
+from math import pi
+
+import numpy as np
+import pandas as pd
+
+from timeseries import MISSING
+
+
+PIE_COLORS = ['#039d72', '#45BA7E', '#de324c', '#f4895f', '#f8e16f',
+              '#95cf92', '#369acc', '#9656a2', '#B74E09', '#61B22E',
+              '#4B2DF7', '#5EB999', '#5DBDE7', '#DD629B', '#B2A6A3',
+              '#C9212C', '#E63DC4', '#A13C50', '#4E4327', '#76A9CA',
+              '#DD7C03', '#DD7C03', '#80D077', '#D84CE4', '#D67956']
+
+# Maximum number of points shipped for a daily series.
+MAX_POINTS = 2000
+
+
+def _counts(values):
+    # int64 is not one of Bokeh's binary array types on every version.
+    return np.asarray(values, dtype=np.int32)
+
+
+def bar_data(crosstab):
+    """Column dict for ``vbar_stack``: categories plus one count array per state."""
+    data = {'categories': list(crosstab.categories)}
+    for state in crosstab.states:
+        data[state] = _counts(crosstab.column(state))
+    return data
+
+
+def pie_data(categories, values, colors=PIE_COLORS, label_radius=0.9):
+    """Column dict for a wedge chart of ``values`` per category.
+
+    ``label_x``/``label_y`` place each value label just outside the middle of
+    its wedge (centre at (0, 1)).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    angle = values / (values.sum() or 1) * 2 * pi
+    end = np.cumsum(angle)
+    start = end - angle
+    middle = start + angle / 2
+    return {
+        'category': list(categories),
+        'value': _counts(values),
+        'angle': angle,
+        'start_angle': start,
+        'end_angle': end,
+        'color': [colors[i % len(colors)] for i in range(len(values))],
+        'label_x': label_radius * np.cos(middle),
+        'label_y': 1 + label_radius * np.sin(middle),
+    }
+
+
+def line_data(total, failed, successful):
+    """Column dict for the yearly line chart from three per-year Series.
+
+    The Series are aligned on the union of their years, so a year without
+    failed or successful campaigns shows 0 instead of shifting the line.
+    """
+    years = total.index.union(failed.index).union(successful.index)
+    return {
+        'year': np.asarray(years, dtype=np.int32),
+        'total': _counts(total.reindex(years, fill_value=0)),
+        'failed': _counts(failed.reindex(years, fill_value=0)),
+        'successful': _counts(successful.reindex(years, fill_value=0)),
+    }
+
+
+def heatmap_data(categories, countries, means):
+    """Column dict of a categories x countries grid of ``means`` (NaN where empty)."""
+    means = np.asarray(means, dtype=np.float64)
+    return {
+        'category': np.repeat(np.asarray(categories, dtype=object), len(countries)).tolist(),
+        'country': np.tile(np.asarray(countries, dtype=object), len(categories)).tolist(),
+        'value': means.ravel(),
+    }
+
+
+def patches(old, new, max_changed=0.25):
+    """``ColumnDataSource.patch`` argument turning columns ``old`` into ``new``.
+
+    Columns must keep their length.  Unchanged columns are left out; columns
+    where at most ``max_changed`` of the values differ are patched by index,
+    the others are replaced as one slice.
+    """
+    result = {}
+    for col, values in new.items():
+        values = np.asarray(values)
+        current = np.asarray(old[col])
+        if len(values) != len(current):
+            raise ValueError('column %r changed length (%d -> %d)'
+                             % (col, len(current), len(values)))
+        same = (values == current) | (pd.isna(values) & pd.isna(current))
+        changed = np.flatnonzero(~same)
+        if not len(changed):
+            continue
+        if len(changed) <= max_changed * len(values):
+            result[col] = list(zip(changed.tolist(), values[changed].tolist()))
+        else:
+            result[col] = [(slice(0, len(values)), values)]
+    return result
+
+
+def daily_counts(days):
+    """``(days, counts)`` of events per calendar day, zero-filled between the first and last day.
+
+    ``days`` are epoch days as returned by ``timeseries.epoch_days``; both
+    arrays are empty when none is known.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    days = days[days != MISSING]
+    if not len(days):
+        return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.int64)
+    first = days.min()
+    counts = np.bincount(days - first)
+    return (first + np.arange(len(counts))).astype('datetime64[D]'), counts
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    """Min/max decimation of ``(x, y)`` to at most ``max_points`` points.
+
+    The series is cut into ``max_points // 2`` equal buckets and, per bucket,
+    the positions of the minimum and maximum are kept (in order), together
+    with the first and last point.
+    """
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    buckets = max(max_points // 2 - 1, 1)
+    size = -(-n // buckets)
+    padded = np.pad(np.asarray(y), (0, buckets * size - n), mode='edge').reshape(buckets, size)
+    base = np.arange(buckets) * size
+    keep = np.concatenate([[0, n - 1],
+                           base + padded.argmin(axis=1),
+                           base + padded.argmax(axis=1)])
+    keep = np.unique(np.minimum(keep, n - 1))
+    return x[keep], y[keep]
+
+
+def daily_series(days, max_points=MAX_POINTS):
+    """``(days, counts)`` of epoch ``days`` per day, decimated for display."""
+    days, counts = daily_counts(days)
+    return decimate(days, counts, max_points)
+
+
+def daily_data(days, counts):
+    """Column dict of a (decimated) daily series."""
+    return {'day': np.asarray(days), 'count': _counts(counts)}
+
+
+class ChartData:
+    """Builds each chart's ``ColumnDataSource`` once and hands out the same object.
+
+    A source can only belong to one Bokeh document, so use one ``ChartData``
+    per document (a report page or a server session).
+    """
+
+    def __init__(self, crosstab, total_by_yr=None, failed_by_yr=None,
+                 successful_by_yr=None, daily=None):
+        self.crosstab = crosstab
+        self._yearly = (total_by_yr, failed_by_yr, successful_by_yr)
+        # (days, counts) from ``daily_series``
+        self._daily = daily
+        self._sources = {}
+
+    def _source(self, name, build):
+        if name not in self._sources:
+            from bokeh.models import ColumnDataSource
+            self._sources[name] = ColumnDataSource(build())
+        return self._sources[name]
+
+    @property
+    def bar(self):
+        return self._source('bar', lambda: bar_data(self.crosstab))
+
+    @property
+    def pie(self):
+        return self._source('pie', lambda: pie_data(self.crosstab.categories,
+                                                     self.crosstab.totals()))
+
+    @property
+    def line(self):
+        return self._source('line', lambda: line_data(*self._yearly))
+
+    @property
+    def daily_launches(self):
+        return self._source('daily_launches', lambda: daily_data(*self._daily))
@@ -0,0 +1,183 @@
+"""Declarative cleaning rules for the Kickstarter frame.
+
+Each rule is applied as one vectorized operation: fills only rewrite the
+column they target (and only when it has nulls), column drops never copy the
+remaining data, and all row predicates are OR-ed into a single mask so the
+frame is filtered at most once.  Rules only look at the rows they are given,
+so the same stage can be applied to a full frame or to every chunk of a
+streamed CSV, with one exception: ``superseded`` compares the rows of a
+campaign with each other, and the snapshots of a campaign may sit in
+different chunks.  Chunked readers therefore first collect the ``id`` and
+``state_changed_at`` of the whole input in hash partitions on disk
+(``SnapshotPartitions``), find the superseded rows one partition at a time
+and pass every chunk its share as the ``drop`` mask of ``clean_kickstarter``.
+
+Bump ``CLEANING_VERSION`` whenever the rules (or the columns the loader
+derives) change so that cached cleaned frames are rebuilt.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from loader import INSPECTED_COLUMNS, fillna_categorical
+
+
+CLEANING_VERSION = 7
+
+FillDefault = namedtuple('FillDefault', ['column', 'value'])
+DropColumns = namedtuple('DropColumns', ['columns'])
+# ``predicate(df)`` returns a boolean array, True for the rows to drop.
+DropRows = namedtuple('DropRows', ['predicate', 'reason'])
+
+
+def empty_name(df):
+    """Rows without a usable project name (name_len is 0 or missing)."""
+    return ~(df['name_len'].to_numpy() > 0)
+
+
+def superseded(df):
+    """Rows of a campaign ``id`` that a later snapshot of it replaces.
+
+    Snapshots are ordered by ``state_changed_at_ts`` (when the frame has it)
+    and then by position, so of equally recent rows the last one is kept.
+    """
+    if 'id' not in df.columns or not len(df):
+        return np.zeros(len(df), dtype=bool)
+    ids = df['id'].to_numpy()
+    version = (df['state_changed_at_ts'].to_numpy() if 'state_changed_at_ts' in df.columns
+               else np.zeros(len(df), dtype=np.int64))
+    order = np.lexsort((np.arange(len(df)), version, ids))
+    # The last row of every id run in ``order`` is the latest snapshot.
+    sorted_ids = ids[order]
+    drop = np.empty(len(df), dtype=bool)
+    drop[order] = np.append(sorted_ids[:-1] == sorted_ids[1:], False)
+    return drop
+
+
+# Columns ``superseded`` looks at, as read from the CSV.
+SNAPSHOT_COLUMNS = ['id', 'state_changed_at']
+
+
+# Rows per partition of ``SnapshotPartitions``, 24 bytes each in memory.
+PARTITION_ROWS = 1 << 20
+
+# Fewest bytes of CSV per row, to size the partitions from the input size.
+MIN_ROW_BYTES = 64
+
+_SNAPSHOT = np.dtype([('id', np.int64), ('version', np.int64), ('position', np.int64)])
+
+
+class SnapshotPartitions:
+    """``superseded`` over an input too large to hold, via hash partitions of ``id`` on disk.
+
+    ``add`` appends the id, ``state_changed_at_ts`` and input position of
+    every row of a chunk to the partition file of its id.  All snapshots of a
+    campaign land in the same partition, so ``superseded_positions`` finds
+    them one partition at a time and only one partition (about
+    ``PARTITION_ROWS`` rows) is in memory.
+    """
+
+    def __init__(self, directory, input_bytes):
+        self.directory = directory
+        self.partitions = max(1, -(-input_bytes // (PARTITION_ROWS * MIN_ROW_BYTES)))
+
+    def _path(self, writer, partition):
+        return os.path.join(self.directory, '%d-%d.snapshots' % (writer, partition))
+
+    def add(self, df, offset, writer=0):
+        """Record the rows of ``df``, the first of which is at input position ``offset``.
+
+        Processes adding in parallel must pass distinct ``writer`` numbers.
+        """
+        records = np.empty(len(df), dtype=_SNAPSHOT)
+        records['id'] = df['id'].to_numpy(dtype=np.int64)
+        records['version'] = (df['state_changed_at_ts'].to_numpy()
+                              if 'state_changed_at_ts' in df.columns else 0)
+        records['position'] = offset + np.arange(len(df))
+        partition = pd.util.hash_array(records['id']) % np.uint64(self.partitions)
+        order = np.argsort(partition, kind='stable')
+        bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1))
+        for p in np.flatnonzero(np.diff(bounds)):
+            with open(self._path(writer, p), 'ab') as fh:
+                records[order[bounds[p]:bounds[p + 1]]].tofile(fh)
+
+    def superseded_positions(self):
+        """Sorted input positions of the rows that a later snapshot replaces."""
+        names = os.listdir(self.directory)
+        dropped = [np.empty(0, dtype=np.int64)]
+        for p in range(self.partitions):
+            suffix = '-%d.snapshots' % p
+            parts = [np.fromfile(os.path.join(self.directory, name), dtype=_SNAPSHOT)
+                     for name in names if name.endswith(suffix)]
+            if not parts:
+                continue
+            records = np.concatenate(parts)
+            records = records[np.argsort(records['position'], kind='stable')]
+            frame = pd.DataFrame({'id': records['id'],
+                                  'state_changed_at_ts': records['version']})
+            dropped.append(records['position'][superseded(frame)])
+        return np.sort(np.concatenate(dropped))
+
+
+def position_mask(positions, offset, n):
+    """Mask of the ``n`` rows from input position ``offset`` that are in sorted ``positions``."""
+    lo, hi = np.searchsorted(positions, [offset, offset + n])
+    mask = np.zeros(n, dtype=bool)
+    mask[positions[lo:hi] - offset] = True
+    return mask
+
+
+CLEANING_RULES = [
+    DropColumns(INSPECTED_COLUMNS),
+    FillDefault('blurb', 'Missing blurb'),
+    FillDefault('blurb_len', 0),
+    FillDefault('blurb_len_clean', 0),
+    FillDefault('location', 'No location specified'),
+    FillDefault('category', 'Uncategorized'),
+    DropRows(empty_name, 'incomplete row: empty name'),
+    DropRows(superseded, 'duplicate id: older snapshot'),
+]
+
+
+def apply_rules(df, rules, profile=None, drop=None):
+    """Apply ``rules`` to ``df``.
+
+    Column rules modify ``df`` in place; the returned frame is ``df`` itself
+    unless a row rule matched, in which case it is the filtered frame.
+    Rules naming columns that ``df`` does not have are skipped.  A
+    ``nullprofile.NullProfile`` of ``df`` passed as ``profile`` is kept in
+    step with every rule.  ``drop`` is a boolean mask of further rows to
+    drop, e.g. the superseded rows of a chunk (``position_mask``).
+    """
+    if drop is not None:
+        drop = np.asarray(drop, dtype=bool)
+    for rule in rules:
+        if isinstance(rule, DropColumns):
+            present = [col for col in rule.columns if col in df.columns]
+            if present:
+                df.drop(columns=present, inplace=True)
+                if profile is not None:
+                    profile.drop_columns(present)
+        elif isinstance(rule, FillDefault):
+            if rule.column in df.columns and df[rule.column].hasnans:
+                df[rule.column] = fillna_categorical(df[rule.column], rule.value)
+                if profile is not None:
+                    profile.clear(rule.column)
+        elif isinstance(rule, DropRows):
+            mask = np.asarray(rule.predicate(df), dtype=bool)
+            drop = mask if drop is None else drop | mask
+        else:
+            raise TypeError('unknown cleaning rule: %r' % (rule,))
+
+    if drop is not None and drop.any():
+        df = df[~drop]
+        if profile is not None:
+            profile.take(~drop)
+    return df
+
+
+def clean_kickstarter(df, profile=None, drop=None):
+    """Apply ``CLEANING_RULES`` to a frame or a chunk from ``loader``."""
+    return apply_rules(df, CLEANING_RULES, profile, drop)
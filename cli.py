@@ -0,0 +1,182 @@
+"""Command line entry point for the Kickstarter analysis.
+
+    python cli.py summary            # text summary, no plotting libraries loaded
+    python cli.py charts [-o DIR]    # full static report (see report.py)
+    python cli.py charts --streaming # same report in bounded memory (see streaming.py)
+    python cli.py heatmap [-o DIR]   # only the backers heatmap
+    python cli.py query --by country launched_at_month --rate   # ad-hoc cube query
+
+Only the standard library is imported at module level; every subcommand
+imports what it needs when it runs, so a summary job never pays for Bokeh,
+matplotlib or seaborn.  ``--import-times`` prints how long those imports took
+and ``--trace`` records per-stage timings (see instrument.py).  The report
+aggregates are kept in the result cache (see resultcache.py), so repeated
+``charts`` and ``heatmap`` runs on an unchanged CSV do not touch the rows.
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+
+# Modules each subcommand needs, imported (and timed) in this order.
+COMMAND_IMPORTS = {
+    'summary': ['numpy', 'pandas', 'pyarrow', 'cache'],
+    'charts': ['numpy', 'pandas', 'pyarrow', 'cache', 'resultcache', 'report'],
+    'heatmap': ['numpy', 'pandas', 'pyarrow', 'cache', 'resultcache', 'report', 'matplotlib',
+                'seaborn'],
+    'query': ['numpy', 'pandas', 'pyarrow', 'cache', 'cube'],
+}
+
+IMPORT_TIMES = {}
+
+
+def timed_import(name):
+    """Import ``name`` and record the wall time it took (0 if already loaded)."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def summary(args):
+    cache = timed_import('cache')
+    df = cache.load_clean_frame(args.csv, columns=['state', 'category', 'usd_goal',
+                                                   'SuccessfulBool'])
+    states = df['state'].value_counts()
+    usd_goal = df['usd_goal']
+    successful = df['SuccessfulBool'] == 1
+
+    print('Campaigns: %d' % len(df))
+    for state, count in states.items():
+        print('  %-11s %7d  (%.1f%%)' % (state, count, 100.0 * count / len(df)))
+    print('Success rate: %.1f%%' % (100.0 * successful.mean()))
+    print('Median goal (USD): successful %.0f, failed %.0f'
+          % (usd_goal[successful].median(), usd_goal[~successful].median()))
+    print('Top categories: %s' % ', '.join(df['category'].value_counts().index[:5]))
+
+
+def _compute_report_data(args):
+    if args.streaming:
+        streaming = timed_import('streaming')
+        return streaming.stream_report_data(args.csv, args.chunksize)
+    cache = timed_import('cache')
+    report = timed_import('report')
+    df = cache.load_clean_frame(args.csv)
+    return report.build_report_data(df, cache.load_registry())
+
+
+def _report_data(args):
+    # Streaming merges per-chunk sketches, so its result depends on the chunk
+    # size and is cached apart from the in-memory one.
+    if args.recompute:
+        return _compute_report_data(args)
+    cache = timed_import('cache')
+    resultcache = timed_import('resultcache')
+    report = timed_import('report')
+    results = resultcache.ResultCache(disk_dir=cache.CACHE_DIR)
+    params = {'report_version': report.REPORT_VERSION, 'streaming': args.streaming,
+              'chunksize': args.chunksize if args.streaming else None}
+    # The streaming path never builds the cleaned frame's entry, so register
+    # it; otherwise nothing would prune these results once the CSV changes.
+    version = os.path.basename(cache.artifact_entry(args.csv))
+    return results.get_or_compute(version, 'report_data', params,
+                                  lambda: _compute_report_data(args))
+
+
+def charts(args):
+    report = timed_import('report')
+    paths = report.render_report(_report_data(args), out_dir=args.out, charts=args.charts,
+                                 workers=args.workers)
+    for name, path in paths.items():
+        print('%-10s %s' % (name, path))
+
+
+def heatmap(args):
+    report = timed_import('report')
+    paths = report.render_report(_report_data(args), out_dir=args.out, charts=['heatmap'],
+                                 workers=1)
+    print(paths['heatmap'])
+
+
+def query(args):
+    cube = timed_import('cube').load_cube(args.csv)
+    where = {}
+    if args.years:
+        where['launched_at_yr'] = range(args.years[0], args.years[1] + 1)
+    if args.country:
+        where['country'] = args.country
+    if args.state:
+        where['state'] = args.state
+    if args.rate:
+        result = cube.success_rate(args.by, where)
+    else:
+        result = cube.query(args.by, where)
+    print(result.to_string())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Kickstarter campaign analysis')
+    parser.add_argument('--csv', default='kickstarter_data_full.csv',
+                        help='source CSV (default: %(default)s)')
+    parser.add_argument('--import-times', action='store_true',
+                        help='print the time spent importing modules')
+    parser.add_argument('--trace', metavar='PATH',
+                        help="append per-stage timings as JSON lines to PATH ('-' for stderr)")
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help='with --trace, also dump a cProfile capture per stage into DIR')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('summary', help='print a text summary')
+
+    charts_parser = commands.add_parser('charts', help='render the static report')
+    charts_parser.add_argument('-o', '--out', default='report', help='output directory')
+    charts_parser.add_argument('--charts', nargs='+', help='subset of charts to render')
+    charts_parser.add_argument('--workers', type=int, help='chart rendering processes')
+
+    heatmap_parser = commands.add_parser('heatmap', help='render the backers heatmap')
+    heatmap_parser.add_argument('-o', '--out', default='report', help='output directory')
+
+    query_parser = commands.add_parser('query', help='roll up the pre-aggregated cube')
+    query_parser.add_argument('--by', nargs='*', default=[],
+                              help='dimensions to group by (category, state, country, '
+                                   'launched_at_yr, launched_at_month)')
+    query_parser.add_argument('--years', type=int, nargs=2, metavar=('FROM', 'TO'),
+                              help='only campaigns launched in this year range')
+    query_parser.add_argument('--country', nargs='+', help='only these countries')
+    query_parser.add_argument('--state', nargs='+', help='only these states')
+    query_parser.add_argument('--rate', action='store_true',
+                              help='print the success rate instead of counts and means')
+
+    for sub in (charts_parser, heatmap_parser):
+        sub.add_argument('--streaming', action='store_true',
+                         help='aggregate the CSV chunk by chunk in bounded memory')
+        sub.add_argument('--chunksize', type=int, default=500000,
+                         help='rows per chunk in streaming mode (default: %(default)s)')
+        sub.add_argument('--recompute', action='store_true',
+                         help='ignore report aggregates cached by an earlier run')
+    return parser
+
+
+COMMANDS = {'summary': summary, 'charts': charts, 'heatmap': heatmap, 'query': query}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        timed_import('instrument').configure(args.trace, args.profile_dir)
+    for name in COMMAND_IMPORTS[args.command]:
+        timed_import(name)
+    COMMANDS[args.command](args)
+
+    if args.import_times:
+        print('Import times:', file=sys.stderr)
+        for name, seconds in IMPORT_TIMES.items():
+            print('  %-12s %8.1f ms' % (name, seconds * 1000), file=sys.stderr)
+        print('  %-12s %8.1f ms' % ('total', sum(IMPORT_TIMES.values()) * 1000),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""State x category count matrix for the Kickstarter visualisations.
+
+The whole matrix is computed in a single pass over the registry codes (see
+encoding.py) of the ``category`` and ``state`` columns, so the bar chart, the
+pie chart and the per-category dictionaries all read from one aggregation
+instead of filtering the frame once per state.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from encoding import DimensionRegistry
+
+
+class Crosstab(namedtuple('Crosstab', ['counts', 'categories', 'states'])):
+    """Dense ``len(categories) x len(states)`` int64 count matrix.
+
+    Row ``i`` belongs to ``categories[i]`` and column ``j`` to ``states[j]``;
+    both follow the registry codes, so they stay stable between runs.
+    """
+
+    __slots__ = ()
+
+    def column(self, state):
+        """Counts per category for one state, in category order."""
+        return self.counts[:, self.states.index(state)]
+
+    def totals(self):
+        """Counts per category summed over every state."""
+        return self.counts.sum(axis=1)
+
+    def as_dict(self, state=None):
+        """``{category: count}`` for one state, or for all states if None."""
+        values = self.totals() if state is None else self.column(state)
+        return dict(zip(self.categories, values.tolist()))
+
+
+def _crosstab(counts, registry):
+    categories = list(registry['category'].labels)
+    states = list(registry['state'].labels)
+    matrix = np.zeros((len(categories), len(states)), dtype=np.int64)
+    matrix[:counts.shape[0], :counts.shape[1]] = counts
+    return Crosstab(matrix, categories, states)
+
+
+def crosstab_from_counts(counts, registry=None):
+    """``Crosstab`` from a categories x states count frame (e.g. merged partials).
+
+    Categories or states without counts get zeros; ones the registry does not
+    know yet are appended to it instead of being dropped.
+    """
+    registry = registry or DimensionRegistry()
+    cat_codes = registry['category'].codes(counts.index)
+    state_codes = registry['state'].codes(counts.columns)
+    matrix = np.zeros((len(registry['category']), len(registry['state'])), dtype=np.int64)
+    matrix[np.ix_(cat_codes, state_codes)] = counts.to_numpy(dtype=np.int64)
+    return _crosstab(matrix, registry)
+
+
+def state_category_crosstab(df, registry=None):
+    """Count rows of ``df`` per (category, state) in one pass.
+
+    Every category and state gets a row/column, in registry code order
+    (``CATEGORIES`` and ``STATES`` first); only null labels are skipped.
+    """
+    registry = registry or DimensionRegistry()
+    cat_codes = registry.codes(df, 'category')
+    state_codes = registry.codes(df, 'state')
+    n_states = len(registry['state'])
+
+    valid = (cat_codes >= 0) & (state_codes >= 0)
+    flat = cat_codes[valid].astype(np.int64) * n_states + state_codes[valid]
+    counts = np.bincount(flat, minlength=len(registry['category']) * n_states)
+    return _crosstab(counts.reshape(-1, n_states), registry)
@@ -0,0 +1,231 @@
+"""Pre-aggregated OLAP cube for slice-and-dice queries.
+
+The cube is a dense array over category x state x country x launch year x
+launch month (or any other list of ``DIMENSIONS``) holding the campaign count and the sums of ``backers_count``,
+``usd_goal`` and ``usd_pledged`` per cell.  It is built in one
+``np.bincount`` pass per measure over the registry codes of the cleaned
+frame; afterwards every roll-up (sum over the dimensions not asked for) and
+slice (index along the filtered dimensions) touches only the cube, a few
+hundred thousand cells at most, never the rows.  Query results are memoised,
+so repeated questions are dictionary lookups.
+
+Cubes merge by adding cells, so they can be built per chunk or per shard, and
+are saved next to the cached frame they were built from (``load_cube``).
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import CACHE_DIR, entry_path, load_clean_frame, load_registry
+from encoding import DimensionRegistry
+from loader import ANALYSIS_COLUMNS, CSV_PATH
+
+
+CUBE_DIMENSIONS = ['category', 'state', 'country', 'launched_at_yr', 'launched_at_month']
+
+CUBE_MEASURES = ['backers_count', 'usd_goal', 'usd_pledged']
+
+# Dimensions whose codes come from the ``encoding.DimensionRegistry``.
+CODED_DIMENSIONS = ['category', 'state', 'country']
+
+# Lower edges (USD) and labels of the ``goal_band`` dimension.
+GOAL_BAND_EDGES = [0, 1000, 5000, 10000, 50000, 100000]
+GOAL_BANDS = ['<1k', '1k-5k', '5k-10k', '10k-50k', '50k-100k', '100k+']
+
+# Every dimension a cube can have and the frame column it is derived from.
+DIMENSIONS = {
+    'category': 'category',
+    'state': 'state',
+    'country': 'country',
+    'launched_at_yr': 'launched_at_yr',
+    'launched_at_month': 'launched_at_month',
+    'goal_band': 'usd_goal',
+}
+
+
+def _as_list(value):
+    if isinstance(value, (str, int, np.integer)):
+        return [value]
+    return list(value)
+
+
+def _dimension(df, dim, registry):
+    # (codes, labels) of one dimension; codes index the labels, -1 is skipped.
+    if dim in CODED_DIMENSIONS:
+        return registry.codes(df, dim), list(registry[dim].labels)
+    if dim == 'launched_at_yr':
+        years = df[dim].to_numpy(dtype=np.int64)
+        first = int(years.min()) if len(years) else 0
+        last = int(years.max()) if len(years) else -1
+        return years - first, list(range(first, last + 1))
+    if dim == 'launched_at_month':
+        return df[dim].to_numpy(dtype=np.int64) - 1, list(range(1, 13))
+    if dim == 'goal_band':
+        goals = df['usd_goal'].to_numpy()
+        codes = np.searchsorted(GOAL_BAND_EDGES, goals, side='right') - 1
+        return np.where(np.isnan(goals), -1, codes), list(GOAL_BANDS)
+    raise KeyError('unknown cube dimension: %r' % (dim,))
+
+
+class Cube:
+    """Counts and measure sums per cell of its dimensions."""
+
+    def __init__(self, labels, counts, sums):
+        # dimension -> labels along that axis, in axis order
+        self.labels = labels
+        self.dimensions = list(labels)
+        self.counts = counts
+        self.sums = sums
+        self._positions = {dim: {label: i for i, label in enumerate(labels[dim])}
+                           for dim in self.dimensions}
+        self._memo = {}
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    @classmethod
+    def from_frame(cls, df, registry=None, dimensions=CUBE_DIMENSIONS):
+        """Cube of the cleaned frame ``df`` over ``dimensions``, coded with ``registry``."""
+        registry = registry or DimensionRegistry()
+        labels = {}
+        codes = []
+        for dim in dimensions:
+            dim_codes, labels[dim] = _dimension(df, dim, registry)
+            codes.append(dim_codes)
+
+        shape = tuple(len(labels[dim]) for dim in dimensions)
+        valid = np.logical_and.reduce([c >= 0 for c in codes])
+        flat = np.ravel_multi_index([c[valid] for c in codes], shape)
+        size = int(np.prod(shape))
+        counts = np.bincount(flat, minlength=size).reshape(shape)
+        sums = {col: np.bincount(flat, weights=df[col].to_numpy(dtype=np.float64)[valid],
+                                 minlength=size).reshape(shape)
+                for col in CUBE_MEASURES}
+        return cls(labels, counts, sums)
+
+    def merge(self, other):
+        """Add the cells of ``other`` (same dimensions, labels are unioned) to this cube."""
+        if other.dimensions != self.dimensions:
+            raise ValueError('cannot merge cubes over %r and %r'
+                             % (self.dimensions, other.dimensions))
+        labels = {}
+        for dim in self.dimensions:
+            if dim == 'launched_at_yr':
+                years = self.labels[dim] + other.labels[dim]
+                labels[dim] = list(range(min(years), max(years) + 1)) if years else []
+            else:
+                labels[dim] = list(self.labels[dim]) + [
+                    label for label in other.labels[dim] if label not in self._positions[dim]]
+
+        shape = tuple(len(labels[dim]) for dim in self.dimensions)
+        counts = np.zeros(shape, dtype=np.int64)
+        sums = {col: np.zeros(shape) for col in CUBE_MEASURES}
+        positions = {dim: {label: i for i, label in enumerate(labels[dim])}
+                     for dim in self.dimensions}
+        for cube in (self, other):
+            index = np.ix_(*[[positions[dim][label] for label in cube.labels[dim]]
+                             for dim in self.dimensions])
+            counts[index] += cube.counts
+            for col in CUBE_MEASURES:
+                sums[col][index] += cube.sums[col]
+        self.__init__(labels, counts, sums)
+        return self
+
+    def _slice(self, array, where):
+        for axis, dim in enumerate(self.dimensions):
+            if dim in where:
+                positions = [self._positions[dim][label] for label in _as_list(where[dim])
+                             if label in self._positions[dim]]
+                array = np.take(array, positions, axis=axis)
+        return array
+
+    def _selected_labels(self, dim, where):
+        if dim not in where:
+            return list(self.labels[dim])
+        return [label for label in _as_list(where[dim]) if label in self._positions[dim]]
+
+    def arrays(self, by=(), where=None):
+        """Dense ``(labels, counts, sums)`` rolled up to the ``by`` dimensions.
+
+        ``where`` maps dimensions to a label or an iterable of labels (e.g.
+        ``{'launched_at_yr': range(2012, 2015), 'country': 'US'}``); labels
+        the cube does not have select nothing.  ``labels`` lists the labels
+        along each ``by`` axis, in ``by`` order.  The arrays are memoised and
+        shared between calls; treat them as read-only.
+        """
+        by = list(by)
+        where = where or {}
+        key = (tuple(by), tuple(sorted((dim, tuple(_as_list(value)))
+                                       for dim, value in where.items())))
+        if key not in self._memo:
+            axes = tuple(i for i, dim in enumerate(self.dimensions) if dim not in by)
+            order = np.argsort([self.dimensions.index(dim) for dim in by])
+            # Rolled-up axes come out in cube order; put them in ``by`` order.
+            transpose = np.argsort(order)
+
+            def rollup(array):
+                return np.transpose(self._slice(array, where).sum(axis=axes), transpose)
+
+            labels = [self._selected_labels(dim, where) for dim in by]
+            self._memo[key] = (labels, rollup(self.counts),
+                               {col: rollup(self.sums[col]) for col in CUBE_MEASURES})
+        return self._memo[key]
+
+    def query(self, by=(), where=None):
+        """Count, sums and means per ``by`` group (groups without campaigns are left out)."""
+        labels, counts, sums = self.arrays(by, where)
+        counts = counts.ravel()
+        data = {'count': counts}
+        for col in CUBE_MEASURES:
+            data[col + '_sum'] = sums[col].ravel()
+            data[col + '_mean'] = np.divide(sums[col].ravel(), counts,
+                                            out=np.full(len(counts), np.nan), where=counts > 0)
+        if by:
+            index = pd.MultiIndex.from_product(labels, names=list(by))
+            if len(by) == 1:
+                index = index.get_level_values(0)
+        else:
+            index = pd.Index(['all'])
+        result = pd.DataFrame(data, index=index)
+        return result[result['count'] > 0]
+
+    def success_rate(self, by=(), where=None):
+        """Share of successful campaigns per ``by`` group (``where`` must not filter ``state``)."""
+        where = dict(where or {})
+        total = self.query(by, where)['count']
+        where['state'] = 'successful'
+        successful = self.query(by, where)['count']
+        return (successful.reindex(total.index, fill_value=0) / total).rename('success_rate')
+
+    def save(self, path):
+        arrays = {'counts': self.counts}
+        arrays.update({'sum_' + col: self.sums[col] for col in CUBE_MEASURES})
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, labels=np.array(json.dumps(self.labels)), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            labels = json.loads(str(data['labels']))
+            return cls(labels, data['counts'],
+                       {col: data['sum_' + col] for col in CUBE_MEASURES})
+
+
+def load_cube(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR,
+              dimensions=CUBE_DIMENSIONS):
+    """Cube of the cleaned frame of ``path``, built once and cached next to it."""
+    suffix = '.cube.npz' if dimensions == CUBE_DIMENSIONS else \
+        '.cube-%s.npz' % hashlib.sha1(','.join(dimensions).encode()).hexdigest()[:10]
+    cube_path = entry_path(path, usecols, cache_dir) + suffix
+    if os.path.exists(cube_path):
+        return Cube.load(cube_path)
+    columns = list(dict.fromkeys([DIMENSIONS[dim] for dim in dimensions] + CUBE_MEASURES))
+    df = load_clean_frame(path, usecols, cache_dir, columns=columns)
+    cube = Cube.from_frame(df, load_registry(cache_dir), dimensions)
+    cube.save(cube_path)
+    return cube
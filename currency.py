@@ -0,0 +1,143 @@
+"""Currency normalization of the money columns.
+
+Campaign amounts are in the campaign's own currency; ``static_usd_rate`` is
+the USD rate Kickstarter recorded for it at launch.  ``normalize_money`` turns
+``goal`` into ``usd_goal`` once, when the frame is loaded, with float32
+arithmetic written straight into the output column, so every later report
+reads the same normalized column instead of recomputing it on a copy.  The
+export's own ``usd_pledged`` is kept as it is; it is only derived from
+``pledged`` the same way when the frame does not have it.
+
+``RateTable`` keeps one rate per (currency, launch day) seen in the data.
+Re-basing USD amounts into another currency (``rebase``) looks the rate of
+each row's launch day up in that table, and ``deflate`` converts them to
+constant dollars of a base year through a price index.  Both lookups are
+vectorized array joins; nothing runs per row in Python.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from timeseries import epoch_days
+
+
+USD_COLUMNS = ['usd_goal', 'usd_pledged']
+
+# Native amount column -> normalized USD column.
+NATIVE_COLUMNS = {'usd_goal': 'goal', 'usd_pledged': 'pledged'}
+
+# US CPI-U annual averages (BLS, 1982-84 = 100).
+US_CPI = {
+    2009: 214.537, 2010: 218.056, 2011: 224.939, 2012: 229.594, 2013: 232.957,
+    2014: 236.736, 2015: 237.017, 2016: 240.007, 2017: 245.120, 2018: 251.107,
+    2019: 255.657,
+}
+
+
+def normalize_money(df):
+    """Add the missing float32 ``usd_goal`` and ``usd_pledged`` to ``df`` in place and return it.
+
+    USD columns the frame already has (the export's ``usd_pledged``) are
+    left untouched.  Frames without the native amounts or ``static_usd_rate``
+    are returned unchanged.
+    """
+    if 'static_usd_rate' not in df.columns:
+        return df
+    rate = df['static_usd_rate'].to_numpy(dtype=np.float32)
+    for usd_col, native_col in NATIVE_COLUMNS.items():
+        if native_col in df.columns and usd_col not in df.columns:
+            usd = df[native_col].to_numpy(dtype=np.float32, copy=True)
+            np.multiply(usd, rate, out=usd)
+            df[usd_col] = usd
+    return df
+
+
+def launch_days(df):
+    """Launch day of every row as days since the epoch (int64)."""
+    return epoch_days(df, 'launched_at')
+
+
+class RateTable:
+    """USD rate per (currency, day), looked up as of the latest known day."""
+
+    def __init__(self, rates=None):
+        # Series of USD per unit of currency, indexed by (currency, day).
+        self.rates = rates if rates is not None else pd.Series(
+            dtype=np.float64, index=pd.MultiIndex.from_arrays([[], []],
+                                                              names=['currency', 'day']))
+        self._lookup = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """Rates recorded in a loaded frame (``currency``, ``launched_at``, ``static_usd_rate``)."""
+        return cls().update(df)
+
+    def update(self, df):
+        """Add the (currency, launch day) rates of ``df``; known entries are kept."""
+        rates = pd.Series(df['static_usd_rate'].to_numpy(dtype=np.float64),
+                          index=pd.MultiIndex.from_arrays(
+                              [np.asarray(df['currency'], dtype=object), launch_days(df)],
+                              names=['currency', 'day']))
+        rates = rates[~rates.index.duplicated()]
+        self.rates = self.rates.combine_first(rates).sort_index()
+        self._lookup = None
+        return self
+
+    def _arrays(self):
+        # One sorted int64 key per (currency code, day) for searchsorted joins.
+        if self._lookup is None:
+            currencies = self.rates.index.get_level_values('currency').to_numpy(dtype=object)
+            codes = pd.Index(pd.unique(currencies))
+            keys = (codes.get_indexer(currencies).astype(np.int64) << 32) \
+                + self.rates.index.get_level_values('day').to_numpy(dtype=np.int64)
+            self._lookup = codes, keys, self.rates.to_numpy()
+        return self._lookup
+
+    def lookup(self, currency, days):
+        """USD per unit of ``currency`` on each of ``days`` (int64 days since the epoch).
+
+        Days before the first known rate of the currency use that first rate.
+        """
+        codes, keys, values = self._arrays()
+        if currency not in codes:
+            raise KeyError('no rates known for currency %r' % (currency,))
+        code = codes.get_loc(currency)
+        start = np.searchsorted(keys, np.int64(code) << 32, side='left')
+        pos = np.searchsorted(keys, (np.int64(code) << 32) + np.asarray(days), side='right') - 1
+        return values[np.maximum(pos, start)]
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            pickle.dump(self.rates, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fh:
+            return cls(pickle.load(fh))
+
+
+def rebase(df, currency, rates, columns=USD_COLUMNS):
+    """``columns`` (USD) of ``df`` converted to ``currency`` at the launch-day rate."""
+    if currency == 'USD':
+        return df[columns].copy()
+    factor = (1.0 / rates.lookup(currency, launch_days(df))).astype(np.float32)
+    return pd.DataFrame({col: df[col].to_numpy(dtype=np.float32) * factor for col in columns},
+                        index=df.index)
+
+
+def deflate(df, base_year, price_index=US_CPI, columns=USD_COLUMNS):
+    """``columns`` (USD) of ``df`` in constant ``base_year`` dollars.
+
+    ``price_index`` maps years to index levels; every ``launched_at_yr`` of
+    ``df`` must be covered.
+    """
+    years = np.array(sorted(price_index))
+    levels = np.array([price_index[year] for year in years], dtype=np.float64)
+    launch_years = df['launched_at_yr'].to_numpy()
+    pos = np.searchsorted(years, launch_years)
+    if (pos >= len(years)).any() or (years[np.minimum(pos, len(years) - 1)] != launch_years).any():
+        raise KeyError('price index does not cover every launch year')
+    factor = (price_index[base_year] / levels[pos]).astype(np.float32)
+    return pd.DataFrame({col: df[col].to_numpy(dtype=np.float32) * factor for col in columns},
+                        index=df.index)
@@ -0,0 +1,145 @@
+"""Interactive Bokeh server dashboard with linked filters.
+
+    python dashboard.py [--csv PATH] [--port 5006] [--show]
+
+Serves the bar, pie, line and heatmap figures of ``figures`` with a launch
+year range, a country filter and a goal band filter shared by all of them.
+Nothing is recomputed from the rows: the app answers every filter change from
+a cube over category x state x country x launch year x goal band (see
+cube.py), which is built once, cached on disk and shared by all sessions of
+the process; the chart columns of each filter combination are memoized
+across sessions as well (see resultcache.py).  The new columns are diffed
+against the current ones and sent as ``ColumnDataSource.patch`` updates, so
+the browser receives only the values that changed and the figures are never
+re-rendered.
+
+The line chart keeps every year (the selected range is shaded) and the
+heatmap every country, so all sources keep their length and can be patched.
+"""
+import argparse
+import functools
+
+import numpy as np
+import pandas as pd
+
+from chartdata import bar_data, heatmap_data, line_data, patches, pie_data
+from crosstab import Crosstab
+from cube import GOAL_BANDS, load_cube
+from loader import CSV_PATH
+from resultcache import RESULTS, dataset_version
+
+
+DASHBOARD_DIMENSIONS = ['category', 'state', 'country', 'launched_at_yr', 'goal_band']
+
+ALL_GOALS = 'All goals'
+
+
+@functools.lru_cache(maxsize=None)
+def dashboard_cube(path=CSV_PATH):
+    """The dashboard cube of ``path``, loaded once per process."""
+    return load_cube(path, dimensions=DASHBOARD_DIMENSIONS)
+
+
+def filters(years=None, countries=None, goal_band=None):
+    """Cube ``where`` for the widget values (None or empty means no filter)."""
+    where = {}
+    if years is not None:
+        where['launched_at_yr'] = range(int(years[0]), int(years[1]) + 1)
+    if countries:
+        where['country'] = list(countries)
+    if goal_band and goal_band != ALL_GOALS:
+        where['goal_band'] = goal_band
+    return where
+
+
+def chart_columns(cube, where):
+    """Column dicts of the bar, pie, line and heatmap sources under ``where``."""
+    (categories, states), counts, _ = cube.arrays(['category', 'state'], where)
+    crosstab = Crosstab(counts, categories, states)
+
+    line_where = {dim: value for dim, value in where.items() if dim != 'launched_at_yr'}
+    (years, states), counts, _ = cube.arrays(['launched_at_yr', 'state'], line_where)
+    by_year = pd.DataFrame(counts, index=years, columns=states)
+
+    # The heatmap keeps every country; unselected ones show as empty cells.
+    heatmap_where = {dim: value for dim, value in where.items() if dim != 'country'}
+    (categories, countries), counts, sums = cube.arrays(['category', 'country'], heatmap_where)
+    shown = counts > 0
+    if 'country' in where:
+        shown &= np.isin(np.asarray(countries, dtype=object), where['country'])
+    means = np.divide(sums['backers_count'], counts, out=np.full(counts.shape, np.nan),
+                      where=shown)
+    return {
+        'bar': bar_data(crosstab),
+        'pie': pie_data(crosstab.categories, crosstab.totals()),
+        'line': line_data(by_year.sum(axis=1), by_year['failed'], by_year['successful']),
+        'heatmap': heatmap_data(categories, countries, means),
+    }
+
+
+def make_document(doc, path=CSV_PATH):
+    """Build one dashboard session into ``doc``."""
+    from bokeh.layouts import column, row
+    from bokeh.models import BoxAnnotation, ColumnDataSource, MultiChoice, RangeSlider, Select
+    from figures import bar_figure, heatmap_figure, line_figure, pie_figure
+
+    cube = dashboard_cube(path)
+    years = cube.labels['launched_at_yr']
+    columns = chart_columns(cube, {})
+    sources = {name: ColumnDataSource(data) for name, data in columns.items()}
+
+    year_range = RangeSlider(title='Launch year', start=years[0], end=years[-1], step=1,
+                             value=(years[0], years[-1]))
+    countries = MultiChoice(title='Country', options=list(cube.labels['country']),
+                            placeholder='All countries')
+    goal_band = Select(title='Goal (USD)', options=[ALL_GOALS] + GOAL_BANDS, value=ALL_GOALS)
+
+    line = line_figure(sources['line'])
+    selected_years = BoxAnnotation(left=years[0], right=years[-1], fill_alpha=0.1,
+                                   fill_color='gray')
+    line.add_layout(selected_years)
+
+    version = dataset_version(path)
+
+    def update(attr, old, new):
+        where = filters(year_range.value, countries.value, goal_band.value)
+        columns = RESULTS.get_or_compute(version, 'dashboard_columns', where,
+                                         lambda: chart_columns(cube, where))
+        for name, data in columns.items():
+            patch = patches(sources[name].data, data)
+            if patch:
+                sources[name].patch(patch)
+        selected_years.left, selected_years.right = year_range.value
+
+    for widget in (year_range, countries, goal_band):
+        widget.on_change('value', update)
+
+    doc.title = 'Kickstarter dashboard'
+    doc.add_root(column(
+        row(year_range, countries, goal_band),
+        row(bar_figure(sources['bar'], cube.labels['category'], cube.labels['state']), line),
+        row(pie_figure(sources['pie']),
+            heatmap_figure(sources['heatmap'], cube.labels['category'],
+                           cube.labels['country'])),
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the Kickstarter dashboard')
+    parser.add_argument('--csv', default=CSV_PATH, help='source CSV (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=5006)
+    parser.add_argument('--show', action='store_true', help='open the dashboard in a browser')
+    args = parser.parse_args(argv)
+
+    from bokeh.server.server import Server
+    # Build (or load) the cube before the first session connects.
+    dashboard_cube(args.csv)
+    server = Server({'/': functools.partial(make_document, path=args.csv)}, port=args.port)
+    server.start()
+    if args.show:
+        server.io_loop.add_callback(server.show, '/')
+    server.io_loop.start()
+
+
+if __name__ == '__main__':
+    main()
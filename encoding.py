@@ -0,0 +1,126 @@
+"""Stable integer codes for the dimension columns.
+
+A ``DimensionRegistry`` holds one code table per dimension (category,
+country, state, location).  Codes are positions in the table: labels are
+only ever appended, so a code keeps its meaning across runs, chunks and
+shards, and a label that was never seen before gets the next free code
+instead of being dropped.
+
+``encode_frame`` rewrites a frame's dimension columns as categoricals whose
+categories *are* the code table, so ``series.cat.codes`` is the registry
+code and aggregations can ``np.bincount``/index NumPy arrays with it
+directly.  The tables are saved as JSON next to the cached frames (see
+cache.py); ``category`` and ``state`` are seeded with the chart order of
+``CATEGORIES`` and ``STATES``.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+DIMENSIONS = ['category', 'country', 'state', 'location']
+
+STATES = ['failed', 'successful', 'canceled', 'live', 'suspended']
+
+# Category order of the bar and pie charts.
+CATEGORIES = ['Academic', 'Places', 'Uncategorized', 'Blues', 'Restaurants',
+              'Webseries', 'Thrillers', 'Shorts', 'Web', 'Apps', 'Gadgets',
+              'Hardware', 'Festivals', 'Plays', 'Musical', 'Flight', 'Spaces',
+              'Immersive', 'Experimental', 'Comedy', 'Wearables', 'Sound',
+              'Software', 'Robots', 'Makerspaces']
+
+# Labels every registry starts with, so their codes never depend on the data.
+SEEDS = {'category': CATEGORIES, 'state': STATES}
+
+REGISTRY_FILE = 'dimensions.json'
+
+
+class Dimension:
+    """Append-only code table of one dimension."""
+
+    def __init__(self, name, labels=()):
+        self.name = name
+        self.labels = []
+        self._index = pd.Index([], dtype=object)
+        self.extend(labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def extend(self, labels):
+        """Append the labels not yet in the table (in first-seen order)."""
+        labels = pd.unique(pd.Index(labels, dtype=object).dropna())
+        new = [label for label in labels if label not in self._index]
+        if new:
+            self.labels.extend(new)
+            self._index = pd.Index(self.labels, dtype=object)
+        return self
+
+    def codes(self, labels):
+        """int32 codes of ``labels``; unseen labels are appended, nulls get -1."""
+        labels = pd.Index(labels, dtype=object)
+        self.extend(labels)
+        return self._index.get_indexer(labels).astype(np.int32)
+
+    def encode(self, values):
+        """``values`` as a categorical whose categories are this table."""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Recode through the (few) categories rather than the rows.
+            mapping = self.codes(values.cat.categories)
+            raw = values.cat.codes.to_numpy()
+            codes = np.where(raw >= 0, mapping[raw] if len(mapping) else raw, -1)
+        else:
+            codes = self.codes(values)
+        dtype = pd.CategoricalDtype(self.labels)
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=values.index,
+                         name=values.name)
+
+
+class DimensionRegistry:
+    """Code tables of every dimension, persisted as one JSON file."""
+
+    def __init__(self, tables=None):
+        tables = tables or {}
+        self.dimensions = {}
+        for name in DIMENSIONS:
+            self.dimensions[name] = Dimension(name, SEEDS.get(name, ())).extend(
+                tables.get(name, ()))
+
+    def __getitem__(self, name):
+        return self.dimensions[name]
+
+    def codes(self, df, name):
+        """Registry codes of ``df[name]`` as an int32 array (-1 for nulls)."""
+        values = df[name]
+        dimension = self.dimensions[name]
+        if isinstance(values.dtype, pd.CategoricalDtype) and \
+                values.cat.categories.equals(dimension._index):
+            return values.cat.codes.to_numpy().astype(np.int32, copy=False)
+        return np.asarray(dimension.encode(values).cat.codes, dtype=np.int32)
+
+    def encode_frame(self, df):
+        """Re-encode the dimension columns of ``df`` in place and return it."""
+        for name in DIMENSIONS:
+            if name in df.columns:
+                df[name] = self.dimensions[name].encode(df[name])
+        return df
+
+    def tables(self):
+        return {name: list(dimension.labels) for name, dimension in self.dimensions.items()}
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.tables(), fh)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Registry saved at ``path``, or a freshly seeded one if there is none."""
+        try:
+            with open(path) as fh:
+                return cls(json.load(fh))
+        except (OSError, ValueError):
+            return cls()
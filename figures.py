@@ -0,0 +1,78 @@
+"""Bokeh figures of the Kickstarter report, built from ``chartdata`` sources.
+
+The figures only reference columns of the sources they are given, so the same
+builders serve the notebook, the static report and the server app.
+"""
+from bokeh.models import ColorBar, LabelSet, LinearColorMapper
+from bokeh.palettes import RdYlGn11
+from bokeh.plotting import figure
+
+
+STATE_COLORS = ['orange', 'red', 'green', 'blue', 'silver']
+
+
+def bar_figure(source, categories, states, colors=STATE_COLORS):
+    """Stacked bar chart of campaign states per category."""
+    p = figure(x_range=list(categories), height=500, title="States of Kicstarter by Categories",
+               toolbar_location=None, tools='hover', tooltips="$name @categories: @$name")
+    colors = [colors[i % len(colors)] for i in range(len(states))]
+    p.vbar_stack(list(states), x='categories', width=0.9, color=colors,
+                 source=source, legend_label=list(states))
+    p.y_range.start = 0
+    p.x_range.range_padding = 0.1
+    p.xgrid.grid_line_color = None
+    p.axis.minor_tick_line_color = None
+    p.outline_line_color = None
+    p.legend.location = "top_left"
+    p.legend.orientation = "horizontal"
+    p.xaxis.major_label_orientation = "vertical"
+    p.xaxis.axis_label = 'Categories'
+    p.yaxis.axis_label = 'No.of Kickstarters'
+    return p
+
+
+def pie_figure(source):
+    """Pie chart of campaigns per category with value labels."""
+    p = figure(height=800, title="Pie Chart", toolbar_location=None,
+               tools="hover", tooltips="@category: @value", x_range=(-0.8, 1.8))
+    p.wedge(x=0, y=1, radius=0.8, start_angle='start_angle', end_angle='end_angle',
+            line_color="white", fill_color='color', legend_field='category', source=source)
+    p.add_layout(LabelSet(x='label_x', y='label_y', text='value', text_align='center',
+                          text_font_size='8pt', source=source))
+    p.axis.axis_label = None
+    p.axis.visible = False
+    return p
+
+
+def line_figure(source):
+    """Total, failed and successful campaigns per launch year."""
+    p = figure(title="Total campaign vs Success/Failure rate", x_axis_label="Year",
+               y_axis_label="Value", width=600, height=400)
+    p.line('year', 'total', source=source, legend_label="Total.", color="blue", line_width=2)
+    p.line('year', 'failed', source=source, legend_label="Failed", color="red", line_width=2)
+    p.line('year', 'successful', source=source, legend_label="Successful", color="green",
+           line_width=2)
+    return p
+
+
+def heatmap_figure(source, categories, countries):
+    """Average number of backers per category and country (``chartdata.heatmap_data``)."""
+    mapper = LinearColorMapper(palette=list(reversed(RdYlGn11)), nan_color='maroon')
+    p = figure(x_range=list(countries), y_range=list(reversed(categories)), width=900,
+               height=700, title="Average Number of backers across Countries per category",
+               toolbar_location=None, tools='hover', tooltips="@category, @country: @value")
+    p.rect(x='country', y='category', width=1, height=1, source=source, line_color=None,
+           fill_color={'field': 'value', 'transform': mapper})
+    p.add_layout(ColorBar(color_mapper=mapper), 'right')
+    p.xaxis.axis_label = 'Country'
+    p.yaxis.axis_label = 'Category'
+    p.grid.grid_line_color = None
+    return p
+
+
+def daily_figure(source):
+    """Campaigns launched per day (decimated)."""
+    p = figure(title="Campaigns launched per day", x_axis_type='datetime',
+               x_axis_label="Day", y_axis_label="Launches", width=900, height=300)
+    p.line('day', 'count', source=source, line_width=1)
+    return p
@@ -0,0 +1,208 @@
+"""Mergeable partial aggregates behind the Kickstarter charts.
+
+Every aggregate the report needs is kept as a partial state per group: a row
+count and, for each measured column, its sum and sum of squares.  Partials of
+two batches merge by adding them, so aggregates can be folded together from
+chunks, shards or daily delta pulls instead of being recomputed over the
+whole dataset.
+
+``AggregateStore`` additionally remembers the contribution of every campaign
+``id`` in a ``store.CampaignStore`` (columns indexed by an id hash table):
+when a delta contains a newer snapshot of a campaign that is already folded
+in (its state changed, more backers pledged, ...) the old contribution is
+subtracted before the new one is added, so a refresh costs O(delta) rather
+than O(dataset).
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from sparsegrid import SparseGrid
+from store import VERSION_COLUMN, CampaignStore
+
+
+# name -> (group keys, measured columns)
+AGGREGATES = {
+    'state_category': (['category', 'state'], []),
+    'year_state': (['launched_at_yr', 'state'], []),
+    'month_state': (['launched_at_month', 'state'], []),
+    'country_category_backers': (['category', 'country'], ['backers_count']),
+    'category_outcome': (['category', 'SuccessfulBool'],
+                         ['usd_goal', 'backers_count', 'usd_pledged']),
+    # Durations are whole days (at most ~90), so their exact histogram is small.
+    'duration': (['category', 'SuccessfulBool', 'launch_to_deadline_days'], []),
+}
+
+
+def _columns(aggregates):
+    columns = []
+    for keys, values in aggregates.values():
+        for col in keys + values:
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def _plain_index(index):
+    # Group keys coming from categoricals keep the (chunk-specific) categories
+    # in their levels; plain values let partials of different batches align.
+    if isinstance(index, pd.MultiIndex):
+        return pd.MultiIndex.from_arrays(
+            [np.asarray(index.get_level_values(i), dtype=object)
+             if isinstance(index.levels[i], pd.CategoricalIndex)
+             else index.get_level_values(i)
+             for i in range(index.nlevels)],
+            names=index.names)
+    if isinstance(index, pd.CategoricalIndex):
+        return pd.Index(np.asarray(index, dtype=object), name=index.name)
+    return index
+
+
+def compute_partials(df, aggregates=AGGREGATES):
+    """Partial states of every aggregate over the rows of ``df``."""
+    partials = {}
+    for name, (keys, values) in aggregates.items():
+        frame = df[keys].copy()
+        frame['count'] = 1
+        for col in values:
+            x = df[col].to_numpy(dtype='float64')
+            frame[col + '_sum'] = x
+            frame[col + '_sumsq'] = x * x
+        part = frame.groupby(keys, observed=True, sort=True).sum()
+        part.index = _plain_index(part.index)
+        partials[name] = part
+    return partials
+
+
+def merge_partials(left, right, sign=1):
+    """``left + sign * right`` for every aggregate; groups left empty are dropped."""
+    merged = {}
+    for name in left.keys() | right.keys():
+        if name not in right:
+            merged[name] = left[name]
+            continue
+        part = right[name] if sign == 1 else right[name] * sign
+        if name in left:
+            part = left[name].add(part, fill_value=0)
+        part = part[part['count'] > 0]
+        merged[name] = part.astype({'count': 'int64'}).sort_index()
+    return merged
+
+
+def _outcome(part, successful):
+    # Groups of failed (0) or successful (1) campaigns, without the SuccessfulBool level.
+    level = part.index.get_level_values('SuccessfulBool')
+    return part[level == int(successful)].droplevel('SuccessfulBool')
+
+
+def _mean(part, col):
+    return part[col + '_sum'] / part['count']
+
+
+class Aggregates:
+    """Chart aggregates backed by mergeable partial states."""
+
+    def __init__(self, partials=None):
+        self.partials = partials if partials is not None else {}
+
+    @classmethod
+    def from_frame(cls, df, aggregates=AGGREGATES):
+        return cls(compute_partials(df, aggregates))
+
+    def merge(self, partials, sign=1):
+        """Fold partials (a dict or another ``Aggregates``) into this one."""
+        if isinstance(partials, Aggregates):
+            partials = partials.partials
+        self.partials = merge_partials(self.partials, partials, sign)
+        return self
+
+    def state_category_counts(self):
+        """Campaign counts, categories x states."""
+        part = self.partials['state_category']
+        return part['count'].unstack(fill_value=0)
+
+    def yearly_counts(self, state=None):
+        """Campaign counts per launch year, for one state or for all."""
+        counts = self.partials['year_state']['count'].unstack(fill_value=0)
+        if state is None:
+            return counts.sum(axis=1)
+        if state not in counts.columns:
+            return pd.Series(0, index=counts.index, name=state)
+        return counts[state]
+
+    def monthly_counts(self):
+        """Campaign counts, launch months x states."""
+        return self.partials['month_state']['count'].unstack(fill_value=0)
+
+    def backers_grid(self):
+        """``sparsegrid.SparseGrid`` of ``backers_count``, categories x countries."""
+        return SparseGrid.from_partial(self.partials['country_category_backers'],
+                                       'backers_count')
+
+    def backers_mean_pivot(self, categories=None, countries=None):
+        """Mean ``backers_count``, categories x countries (NaN where no campaign).
+
+        Only the requested window is densified; it defaults to the categories
+        and countries that have campaigns.
+        """
+        return self.backers_grid().mean_frame(categories, countries)
+
+    def category_means(self, successful):
+        """Per-category means of goal, backers and pledged for failed (0) or successful (1)."""
+        part = _outcome(self.partials['category_outcome'], successful)
+        return pd.DataFrame({col: _mean(part, col)
+                             for col in ['usd_goal', 'backers_count', 'usd_pledged']})
+
+    def duration_counts(self, successful):
+        """Campaign counts per (category, launch_to_deadline_days) for failed (0) or successful (1)."""
+        part = _outcome(self.partials['duration'], successful)
+        return part['count']
+
+    def std(self, name, col):
+        """Per-group population standard deviation of ``col`` in aggregate ``name``."""
+        part = self.partials[name]
+        mean = _mean(part, col)
+        var = part[col + '_sumsq'] / part['count'] - mean * mean
+        return np.sqrt(var.clip(lower=0))
+
+
+class AggregateStore(Aggregates):
+    """``Aggregates`` that can upsert delta batches keyed by campaign ``id``."""
+
+    def __init__(self, aggregates=AGGREGATES):
+        super().__init__()
+        self.aggregates = aggregates
+        self.row_columns = _columns(aggregates)
+        # The values every campaign contributed, to retract them on update.
+        self.campaigns = CampaignStore()
+
+    def __len__(self):
+        return len(self.campaigns)
+
+    def fold(self, delta):
+        """Fold new or changed campaigns into the aggregates.
+
+        Campaigns already in the store have their previous contribution
+        subtracted first.  As in ``store.CampaignStore``, the snapshot with
+        the latest ``state_changed_at`` wins, within ``delta`` and against
+        the stored one.
+        """
+        columns = ['id'] + [col for col in [VERSION_COLUMN] if col in delta.columns]
+        batch, rows, update = self.campaigns.match(delta[columns + self.row_columns])
+        if update.any():
+            old = self.campaigns.frame.iloc[rows[update]]
+            self.merge(compute_partials(old, self.aggregates), sign=-1)
+        changed = batch.iloc[np.flatnonzero(update | (rows < 0))]
+        self.merge(compute_partials(changed, self.aggregates))
+        self.campaigns.apply(batch, rows, update)
+        return self
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            pickle.dump(self, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fh:
+            return pickle.load(fh)
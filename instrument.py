@@ -0,0 +1,127 @@
+"""Per-stage timing and resource instrumentation.
+
+Wrap a named pipeline stage in ``stage``::
+
+    with stage('read_csv') as s:
+        df = load_kickstarter(path)
+        s.rows_out = len(df)
+
+When instrumentation is configured, every stage appends one JSON line with its
+wall time, CPU time, rows in/out and resident-memory delta to the trace file
+(``'-'`` for stderr), and optionally dumps a cProfile capture per stage into
+``profile_dir`` (view it with snakeviz, or turn it into a flamegraph with
+flameprof).  When it is not configured ``stage`` returns a shared no-op
+object, so instrumented code pays one function call per stage.
+"""
+import cProfile
+import json
+import os
+import sys
+import time
+
+
+_config = None
+
+
+def configure(path='-', profile_dir=None):
+    """Enable instrumentation, writing JSON lines to ``path``."""
+    global _config
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    _config = {'path': path, 'profile_dir': profile_dir}
+
+
+def disable():
+    global _config
+    _config = None
+
+
+def current_config():
+    """Arguments that re-create the current configuration (e.g. in worker processes)."""
+    if _config is None:
+        return ()
+    return (_config['path'], _config['profile_dir'])
+
+
+def init_worker(*config):
+    """Process-pool initializer applying ``current_config()`` of the parent."""
+    if config:
+        configure(*config)
+
+
+def _rss_bytes():
+    # Current resident set size; Linux only, None elsewhere.
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _emit(record):
+    line = json.dumps(record) + '\n'
+    if _config['path'] == '-':
+        sys.stderr.write(line)
+        return
+    with open(_config['path'], 'a') as fh:
+        fh.write(line)
+
+
+class _NullStage:
+    rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, rows_in):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self._profile = None
+
+    def __enter__(self):
+        if _config['profile_dir']:
+            self._profile = cProfile.Profile()
+        self._rss = _rss_bytes()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        if self._profile is not None:
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profile is not None:
+            self._profile.disable()
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        rss = _rss_bytes()
+
+        record = {'stage': self.name, 'wall_s': round(wall, 6), 'cpu_s': round(cpu, 6),
+                  'rows_in': self.rows_in, 'rows_out': self.rows_out,
+                  'rss_mb': None if rss is None else round(rss / 2 ** 20, 3),
+                  'rss_delta_mb': None if rss is None or self._rss is None
+                  else round((rss - self._rss) / 2 ** 20, 3),
+                  'pid': os.getpid(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        if self._profile is not None:
+            record['profile'] = os.path.join(
+                _config['profile_dir'], '%s-%d-%d.prof' % (self.name, os.getpid(), time.time_ns()))
+            self._profile.dump_stats(record['profile'])
+        _emit(record)
+        return False
+
+
+def stage(name, rows_in=None):
+    """Context manager instrumenting the stage ``name``; set ``rows_out`` on it."""
+    if _config is None:
+        return _NULL_STAGE
+    return _Stage(name, rows_in)
@@ -0,0 +1,126 @@
+"""Typed, column-pruned reader for ``kickstarter_data_full.csv``.
+
+``pd.read_csv`` on the raw Kaggle dump infers ``object``/``float64``/``int64``
+for everything and parses ~70 columns, most of which the analysis never looks
+at.  The schema below pins compact dtypes for the columns we use and
+``usecols`` skips the rest at parse time, so neither the parse nor the frame
+pays for them.  Every reader also adds the normalized ``usd_goal`` column
+(and ``usd_pledged`` when the export lacks it, see currency.py) and replaces
+the timestamp strings by int64 epoch columns (see timeseries.py) as the frame
+is loaded.
+"""
+import io
+import os
+
+import pandas as pd
+
+from currency import normalize_money
+from timeseries import parse_timestamps
+
+
+CSV_PATH = 'kickstarter_data_full.csv'
+
+CATEGORICAL_COLUMNS = ['state', 'category', 'country', 'location', 'currency']
+
+MONEY_COLUMNS = ['goal', 'pledged', 'usd_pledged', 'static_usd_rate']
+
+SCHEMA = {
+    'id': 'int64',
+    'name': 'object',
+    'blurb': 'object',
+    'backers_count': 'int32',
+    'SuccessfulBool': 'int8',
+    'name_len': 'float32',
+    'name_len_clean': 'float32',
+    'blurb_len': 'float32',
+    'blurb_len_clean': 'float32',
+    'create_to_launch_days': 'int16',
+    'launch_to_deadline_days': 'int16',
+    'launch_to_state_change_days': 'int16',
+}
+SCHEMA.update({col: 'category' for col in CATEGORICAL_COLUMNS})
+SCHEMA.update({col: 'float32' for col in MONEY_COLUMNS})
+for _prefix in ['deadline', 'state_changed_at', 'created_at', 'launched_at']:
+    SCHEMA[_prefix + '_yr'] = 'int16'
+    SCHEMA[_prefix + '_month'] = 'int8'
+    SCHEMA[_prefix + '_day'] = 'int8'
+    SCHEMA[_prefix + '_hr'] = 'int8'
+
+# Columns read by the analysis and the charts.
+ANALYSIS_COLUMNS = [
+    'id', 'name', 'blurb', 'goal', 'pledged', 'state', 'country', 'currency',
+    'backers_count', 'static_usd_rate', 'usd_pledged', 'location', 'category',
+    'name_len', 'name_len_clean', 'blurb_len', 'blurb_len_clean',
+    'launched_at', 'launched_at_yr', 'launched_at_month', 'launch_to_deadline_days',
+    'deadline', 'created_at', 'state_changed_at', 'SuccessfulBool',
+]
+
+# Mostly-null columns that are only inspected before being dropped.
+INSPECTED_COLUMNS = ['friends', 'is_starred', 'is_backing', 'permissions']
+
+
+def _read_options(usecols):
+    if usecols is None:
+        dtype = SCHEMA
+    else:
+        usecols = list(usecols)
+        dtype = {col: SCHEMA[col] for col in usecols if col in SCHEMA}
+    return {'usecols': usecols, 'dtype': dtype}
+
+
+def _prepare(frame):
+    # Columns every reader derives as the frame is loaded.
+    return parse_timestamps(normalize_money(frame))
+
+
+def load_kickstarter(path=CSV_PATH, usecols=ANALYSIS_COLUMNS):
+    """Read the whole CSV into a typed frame.
+
+    ``usecols=None`` reads every column (still with the typed schema).
+    """
+    return _prepare(pd.read_csv(path, **_read_options(usecols)))
+
+
+def iter_kickstarter(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, chunksize=500000):
+    """Stream the CSV as typed frames of at most ``chunksize`` rows.
+
+    Each chunk infers its own categories, so categorical columns of different
+    chunks are only comparable by value, not by code.
+    """
+    with pd.read_csv(path, chunksize=chunksize, **_read_options(usecols)) as reader:
+        for chunk in reader:
+            yield _prepare(chunk)
+
+
+def split_byte_ranges(path=CSV_PATH, n_parts=1):
+    """Split the data lines of a CSV into at most ``n_parts`` contiguous byte ranges.
+
+    Boundaries are moved to line starts, so this assumes no quoted field
+    contains a newline; pre-split shard files do not have that restriction.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fh:
+        bounds = [len(fh.readline())]
+        for i in range(1, n_parts):
+            fh.seek(max(bounds[0], size * i // n_parts))
+            fh.readline()
+            if bounds[-1] < fh.tell() < size:
+                bounds.append(fh.tell())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def load_byte_range(path, start, end, usecols=ANALYSIS_COLUMNS):
+    """Read the rows in bytes ``[start, end)`` of the CSV (see ``split_byte_ranges``)."""
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        fh.seek(start)
+        data = fh.read(end - start)
+    return _prepare(pd.read_csv(io.BytesIO(header + data), **_read_options(usecols)))
+
+
+def fillna_categorical(series, value):
+    """``series.fillna(value)`` that also works when ``value`` is not yet a category."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
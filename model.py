@@ -0,0 +1,302 @@
+"""Logistic-regression success model with batch scoring.
+
+    python model.py [--csv PATH] [--no-text]   # train, report hold-out metrics, save
+
+Features are the drivers named in the conclusions (category, USD goal,
+campaign duration, launch month) plus the country and, optionally, the
+hashed n-grams of ``name`` and ``blurb`` (see textfeatures.py).
+``FeatureEncoder`` turns plain arrays into one sparse CSR row per campaign:
+one-hot registry codes for category and country, one-hot month, and
+standardized ``log1p(usd_goal)`` and duration.  The model is an
+L2-regularized logistic regression fitted with L-BFGS on the sparse matrix.
+
+``FeatureStore`` keeps the encoded rows of known campaigns by ``id``, so
+scoring them is a row lookup and one sparse matrix-vector product.  Drafts
+that are not in the store are encoded from plain arrays by
+``Scorer.score_drafts`` without going through the pandas cleaning pipeline;
+their texts are hashed in batches across a process pool.  The model and the
+store are saved under the cache entry of the cleaned frame they were built
+from, so they are pruned with it and never paired with another CSV's rows.
+"""
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import minimize
+from scipy.special import expit
+
+from cache import entry_path, load_clean_frame, load_registry
+from loader import CSV_PATH
+from textfeatures import TEXT_FIELDS, TextFeatureCache, text_matrix
+
+
+# The model and feature store of a cleaned frame are saved under its cache entry.
+MODEL_SUFFIX = '.model.pkl'
+STORE_SUFFIX = '.features.npz'
+
+FEATURE_COLUMNS = ['category', 'country', 'launched_at_month', 'usd_goal',
+                   'launch_to_deadline_days']
+
+# Hashed n-gram columns per text field in the model.
+TEXT_FEATURES = 2 ** 18
+
+# Draft texts per hashing task, so a large batch of drafts spreads over the pool.
+DRAFT_BATCH_SIZE = 25000
+
+
+def _codes(values, labels):
+    # Position of each value in ``labels``; unknown values get -1.
+    return pd.Index(labels).get_indexer(values).astype(np.int64, copy=False)
+
+
+class FeatureEncoder:
+    """Maps campaign arrays to sparse model rows."""
+
+    def __init__(self, categories, countries, numeric_stats, text_fields=()):
+        self.categories = list(categories)
+        self.countries = list(countries)
+        # column -> (mean, std) of the transformed numeric feature
+        self.numeric_stats = numeric_stats
+        self.text_fields = list(text_fields)
+
+    @classmethod
+    def from_frame(cls, df, registry, text_fields=TEXT_FIELDS):
+        stats = {}
+        for col, values in cls._numeric(df).items():
+            stats[col] = (float(values.mean()), float(values.std()) or 1.0)
+        return cls(registry['category'].labels, registry['country'].labels, stats, text_fields)
+
+    @staticmethod
+    def _numeric(batch):
+        return {
+            'usd_goal': np.log1p(np.asarray(batch['usd_goal'], dtype=np.float64)),
+            'launch_to_deadline_days': np.asarray(batch['launch_to_deadline_days'],
+                                                  dtype=np.float64),
+        }
+
+    @property
+    def n_features(self):
+        return (1 + len(self.categories) + len(self.countries) + 12 + len(self.numeric_stats)
+                + TEXT_FEATURES * len(self.text_fields))
+
+    def transform(self, batch, text=None, workers=None):
+        """CSR rows for ``batch`` (a mapping of ``FEATURE_COLUMNS`` to arrays).
+
+        ``text`` maps each of ``text_fields`` to the rows' hashed n-gram
+        matrix; fields missing from it are hashed from ``batch`` here, across
+        ``workers`` processes.
+        """
+        n = len(batch['usd_goal'])
+        rows = np.arange(n)
+        columns, values, offset = [np.zeros(n, dtype=np.int64)], [np.ones(n)], 1
+        one_hot = [(_codes(batch['category'], self.categories), len(self.categories)),
+                   (_codes(batch['country'], self.countries), len(self.countries)),
+                   (np.asarray(batch['launched_at_month'], dtype=np.int64) - 1, 12)]
+        for codes, width in one_hot:
+            known = (codes >= 0) & (codes < width)
+            columns.append(np.where(known, offset + codes, 0))
+            values.append(known.astype(np.float64))
+            offset += width
+        for col, x in self._numeric(batch).items():
+            mean, std = self.numeric_stats[col]
+            columns.append(np.full(n, offset))
+            values.append(np.nan_to_num((x - mean) / std))
+            offset += 1
+        dense = sparse.csr_matrix(
+            (np.concatenate(values), (np.tile(rows, len(columns)), np.concatenate(columns))),
+            shape=(n, offset))
+
+        blocks = [dense]
+        for field in self.text_fields:
+            matrix = (text or {}).get(field)
+            if matrix is None:
+                matrix, _ = text_matrix(batch[field], workers, DRAFT_BATCH_SIZE,
+                                        n_features=TEXT_FEATURES, vocabulary=False)
+            blocks.append(matrix.sign())
+        return sparse.hstack(blocks, format='csr')
+
+
+class LogisticModel:
+    """L2-regularized logistic regression on sparse rows."""
+
+    def __init__(self, weights=None, l2=1.0):
+        self.weights = weights
+        self.l2 = l2
+
+    def fit(self, X, y, max_iter=200):
+        y = np.asarray(y, dtype=np.float64)
+        n, width = X.shape
+        # Only columns that occur can get a non-zero weight; optimizing over
+        # them alone keeps the L-BFGS state small with 2**18 hashed columns.
+        used = np.unique(X.indices)
+        X = X[:, used]
+        penalty = np.full(len(used), self.l2 / n)
+        penalty[used == 0] = 0.0  # no penalty on the intercept
+
+        def loss(w):
+            z = X @ w
+            # log(1 + exp(z)) - y z, averaged, plus the L2 term.
+            value = np.mean(np.logaddexp(0, z) - y * z) + 0.5 * np.dot(penalty * w, w)
+            grad = X.T @ (expit(z) - y) / n + penalty * w
+            return value, grad
+
+        result = minimize(loss, np.zeros(len(used)), jac=True, method='L-BFGS-B',
+                          options={'maxiter': max_iter})
+        self.weights = np.zeros(width)
+        self.weights[used] = result.x
+        return self
+
+    def predict_proba(self, X):
+        """Success probability of every row of ``X``."""
+        return expit(X @ self.weights)
+
+
+class FeatureStore:
+    """Encoded model rows of known campaigns, keyed by ``id``."""
+
+    def __init__(self, ids, matrix):
+        order = np.argsort(ids, kind='stable')
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.matrix = matrix.tocsr()[order]
+
+    def rows(self, ids):
+        """Rows of ``ids`` (in that order); raises ``KeyError`` for unknown ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, ids)
+        pos = np.minimum(pos, len(self.ids) - 1)
+        missing = self.ids[pos] != ids
+        if missing.any():
+            raise KeyError('campaigns not in the feature store: %s' % ids[missing][:10].tolist())
+        return self.matrix[pos]
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, ids=self.ids, data=self.matrix.data, indices=self.matrix.indices,
+                 indptr=self.matrix.indptr, shape=np.array(self.matrix.shape))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']),
+                                       shape=tuple(data['shape']))
+            return cls(data['ids'], matrix)
+
+
+class Scorer:
+    """Encoder, model and feature store behind the scoring API."""
+
+    def __init__(self, encoder, model, store=None):
+        self.encoder = encoder
+        self.model = model
+        self.store = store
+
+    def score(self, ids):
+        """Success probabilities of campaigns already in the feature store."""
+        return self.model.predict_proba(self.store.rows(ids))
+
+    def score_drafts(self, batch, text=None, workers=None):
+        """Success probabilities of draft campaigns given as arrays (see ``FeatureEncoder``)."""
+        return self.model.predict_proba(self.encoder.transform(batch, text, workers))
+
+    def save(self, path):
+        # Plain state only, so the file loads whether this module ran as
+        # ``__main__`` or was imported.  The store is saved on its own.
+        state = {'encoder': vars(self.encoder), 'weights': self.model.weights,
+                 'l2': self.model.l2}
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, csv_path=CSV_PATH):
+        """The model trained on ``csv_path``, with its feature store if it has one."""
+        entry = entry_path(csv_path)
+        with open(entry + MODEL_SUFFIX, 'rb') as fh:
+            state = pickle.load(fh)
+        encoder = FeatureEncoder(**state['encoder'])
+        model = LogisticModel(state['weights'], state['l2'])
+        store = None
+        if os.path.exists(entry + STORE_SUFFIX):
+            store = FeatureStore.load(entry + STORE_SUFFIX)
+            if store.matrix.shape[1] != encoder.n_features:
+                raise ValueError('feature store %s has %d columns, the model expects %d'
+                                 % (entry + STORE_SUFFIX, store.matrix.shape[1],
+                                    encoder.n_features))
+        return cls(encoder, model, store)
+
+
+def _frame_inputs(df, text_fields, workers=None):
+    # Feature arrays and hashed text matrices of every campaign of ``df``.
+    batch = {col: df[col].to_numpy() for col in FEATURE_COLUMNS}
+    text = {field: TextFeatureCache(field, n_features=TEXT_FEATURES).features(df, workers)
+            for field in text_fields}
+    return batch, text
+
+
+def _take(inputs, rows):
+    batch, text = inputs
+    return ({col: values[rows] for col, values in batch.items()},
+            {field: matrix[rows] for field, matrix in text.items()})
+
+
+def frame_features(df, encoder, workers=None):
+    """Model rows of every campaign of the cleaned frame ``df``."""
+    return encoder.transform(*_frame_inputs(df, encoder.text_fields, workers))
+
+
+def evaluate(model, X, y):
+    """Log loss, accuracy and ROC AUC of ``model`` on ``(X, y)``."""
+    y = np.asarray(y)
+    p = np.clip(model.predict_proba(X), 1e-12, 1 - 1e-12)
+    ranks = np.argsort(np.argsort(p)) + 1
+    positives = y.sum()
+    negatives = len(y) - positives
+    auc = (ranks[y == 1].sum() - positives * (positives + 1) / 2) / max(positives * negatives, 1)
+    return {'log_loss': float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))),
+            'accuracy': float(np.mean((p >= 0.5) == y)), 'auc': float(auc)}
+
+
+def train(df, registry, text_fields=TEXT_FIELDS, l2=1.0, holdout=0.2, seed=0, workers=None):
+    """Fit a ``Scorer`` on the cleaned frame; returns it and its hold-out metrics.
+
+    The metrics come from an encoder and model fitted on the training rows
+    only; the returned scorer is refitted on every row.
+    """
+    inputs = _frame_inputs(df, text_fields, workers)
+    y = df['SuccessfulBool'].to_numpy()
+    test = np.random.default_rng(seed).random(len(y)) < holdout
+    train_rows, test_rows = np.flatnonzero(~test), np.flatnonzero(test)
+    encoder = FeatureEncoder.from_frame(df.iloc[train_rows], registry, text_fields)
+    model = LogisticModel(l2=l2).fit(encoder.transform(*_take(inputs, train_rows)),
+                                     y[train_rows])
+    metrics = evaluate(model, encoder.transform(*_take(inputs, test_rows)), y[test_rows])
+
+    encoder = FeatureEncoder.from_frame(df, registry, text_fields)
+    X = encoder.transform(*inputs)
+    model = LogisticModel(l2=l2).fit(X, y)
+    return Scorer(encoder, model, FeatureStore(df['id'].to_numpy(), X)), metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the campaign success model')
+    parser.add_argument('--csv', default=CSV_PATH, help='source CSV (default: %(default)s)')
+    parser.add_argument('--no-text', action='store_true', help='leave out name/blurb n-grams')
+    parser.add_argument('--l2', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    df = load_clean_frame(args.csv)
+    scorer, metrics = train(df, load_registry(), () if args.no_text else TEXT_FIELDS, args.l2)
+    for name, value in metrics.items():
+        print('%-9s %.4f' % (name, value))
+    entry = entry_path(args.csv)
+    scorer.store.save(entry + STORE_SUFFIX)
+    scorer.save(entry + MODEL_SUFFIX)
+
+
+if __name__ == '__main__':
+    main()
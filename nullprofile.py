@@ -0,0 +1,84 @@
+"""Missing-value index for a frame, built in one scan.
+
+Every column is scanned once for nulls; columns that have any keep their null
+rows as a packed bitmap (one bit per row) next to their null count.  Questions
+such as "which columns have nulls", "which rows of X are null" and "how many
+nulls per column" are then answered from the index instead of rescanning the
+frame, and cleaning steps update the index incrementally.
+"""
+import numpy as np
+import pandas as pd
+
+
+class NullProfile:
+    """Per-column null counts and null-row bitmaps of a frame.
+
+    Bitmaps are positional: bit ``i`` refers to the ``i``-th row of the frame
+    the profile was built from (and kept in step with ``take``).
+    """
+
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self._counts = {}
+        self._bitmaps = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        profile = cls(len(df))
+        profile.refresh(df, df.columns)
+        return profile
+
+    def refresh(self, df, columns):
+        """Re-scan ``columns`` of ``df`` (e.g. after they were modified)."""
+        for col in columns:
+            mask = df[col].isna().to_numpy()
+            count = int(mask.sum())
+            self._counts[col] = count
+            self._bitmaps[col] = np.packbits(mask) if count else None
+
+    def clear(self, column):
+        """Record that ``column`` no longer has nulls (e.g. after a fill)."""
+        self._counts[column] = 0
+        self._bitmaps[column] = None
+
+    def drop_columns(self, columns):
+        for col in columns:
+            self._counts.pop(col, None)
+            self._bitmaps.pop(col, None)
+
+    def take(self, keep):
+        """Keep only the rows where the boolean array ``keep`` is True."""
+        keep = np.asarray(keep, dtype=bool)
+        for col, bits in self._bitmaps.items():
+            if bits is None:
+                continue
+            mask = np.unpackbits(bits, count=self.n_rows).astype(bool)[keep]
+            count = int(mask.sum())
+            self._counts[col] = count
+            self._bitmaps[col] = np.packbits(mask) if count else None
+        self.n_rows = int(keep.sum())
+
+    def null_counts(self):
+        """Null count per column, in column order."""
+        return pd.Series(self._counts, dtype='int64')
+
+    def columns_with_nulls(self):
+        return [col for col, count in self._counts.items() if count]
+
+    def any(self):
+        return any(self._counts.values())
+
+    def null_mask(self, column):
+        """Boolean array, True for the rows where ``column`` is null."""
+        bits = self._bitmaps[column]
+        if bits is None:
+            return np.zeros(self.n_rows, dtype=bool)
+        return np.unpackbits(bits, count=self.n_rows).astype(bool)
+
+    def nulls(self, df, column):
+        """Values of ``column`` in the rows where it is null."""
+        return df[column][self.null_mask(column)]
+
+    def non_nulls(self, df, column):
+        """Values of ``column`` in the rows where it is not null."""
+        return df[column][~self.null_mask(column)]
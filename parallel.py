@@ -0,0 +1,128 @@
+"""Multi-process aggregation over CSV shards.
+
+The input is split into tasks (one per shard file, or byte ranges of a single
+CSV); each worker process loads and cleans its part and reduces it to the
+mergeable partials of ``incremental``.  The parent only merges the small
+partial tables, so the pivot and groupby work scales with the number of
+processes.  ``parallel_sketches`` does the same with the quantile sketches of
+``sketch``, which merge just like the partials.
+
+Older snapshots of a campaign may sit in a different task than the latest
+one, so the workers first write ``id`` and ``state_changed_at`` of their part
+to hash partitions on disk (``cleaning.SnapshotPartitions``); the parent finds
+the superseded rows one partition at a time and hands every task the rows it
+has to drop.
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from cleaning import SNAPSHOT_COLUMNS, SnapshotPartitions, clean_kickstarter, position_mask
+from incremental import AGGREGATES, Aggregates, compute_partials
+from loader import ANALYSIS_COLUMNS, load_byte_range, load_kickstarter, split_byte_ranges
+from sketch import SKETCH_COLUMNS, QuantileSketches
+
+
+# Byte ranges per worker when splitting a single file, for load balancing.
+TASKS_PER_WORKER = 4
+
+# Input position of row ``i`` of task ``t``: ``(t << TASK_BITS) + i``.
+TASK_BITS = 40
+
+
+def _read_shard(task):
+    path, byte_range, usecols = task
+    if byte_range is None:
+        return load_kickstarter(path, usecols=usecols)
+    return load_byte_range(path, byte_range[0], byte_range[1], usecols=usecols)
+
+
+def _load_shard(path, byte_range, usecols, superseded_rows):
+    df = _read_shard((path, byte_range, usecols))
+    drop = np.zeros(len(df), dtype=bool)
+    drop[superseded_rows] = True
+    return clean_kickstarter(df, drop=drop)
+
+
+def _shard_partials(task):
+    path, byte_range, usecols, superseded_rows, aggregates = task
+    return compute_partials(_load_shard(path, byte_range, usecols, superseded_rows),
+                            aggregates)
+
+
+def _shard_sketches(task):
+    path, byte_range, usecols, superseded_rows, columns = task
+    return QuantileSketches.from_frame(_load_shard(path, byte_range, usecols, superseded_rows),
+                                       columns)
+
+
+def plan_tasks(sources, n_tasks):
+    """``(path, byte_range)`` pairs: one per shard, or ``n_tasks`` ranges of a single path."""
+    if isinstance(sources, (str, os.PathLike)):
+        return [(sources, byte_range) for byte_range in split_byte_ranges(sources, n_tasks)]
+    return [(path, None) for path in sources]
+
+
+def _write_snapshots(task):
+    path, byte_range, columns, snapshots, index = task
+    df = _read_shard((path, byte_range, columns))
+    snapshots.add(df, index << TASK_BITS, writer=index)
+    return len(df)
+
+
+def _superseded_rows(map_func, plan, usecols):
+    # Per task, the positions of its rows replaced by a later snapshot in any task.
+    columns = [col for col in SNAPSHOT_COLUMNS if usecols is None or col in usecols]
+    if 'id' not in columns:
+        return [[] for _ in plan]
+    with tempfile.TemporaryDirectory() as directory:
+        snapshots = SnapshotPartitions(directory, sum(
+            os.path.getsize(path) if byte_range is None else byte_range[1] - byte_range[0]
+            for path, byte_range in plan))
+        sizes = list(map_func(_write_snapshots, [(path, byte_range, columns, snapshots, index)
+                                                 for index, (path, byte_range)
+                                                 in enumerate(plan)]))
+        dropped = snapshots.superseded_positions()
+    return [np.flatnonzero(position_mask(dropped, index << TASK_BITS, n))
+            for index, n in enumerate(sizes)]
+
+
+def _map_merge(func, result, sources, workers, usecols, param):
+    workers = workers or os.cpu_count() or 1
+    plan = plan_tasks(sources, workers * TASKS_PER_WORKER)
+
+    def tasks(superseded_rows):
+        return [(path, byte_range, usecols, rows, param)
+                for (path, byte_range), rows in zip(plan, superseded_rows)]
+
+    if workers == 1:
+        for task in tasks(_superseded_rows(map, plan, usecols)):
+            result.merge(func(task))
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        superseded_rows = _superseded_rows(pool.map, plan, usecols)
+        futures = [pool.submit(func, task) for task in tasks(superseded_rows)]
+        for future in as_completed(futures):
+            result.merge(future.result())
+    return result
+
+
+def parallel_aggregates(sources, workers=None, aggregates=AGGREGATES,
+                        usecols=ANALYSIS_COLUMNS):
+    """Aggregates over ``sources`` computed in a pool of ``workers`` processes.
+
+    ``sources`` is a list of CSV shard paths, or a single CSV path that is
+    split into byte ranges.  The result is identical to
+    ``Aggregates.from_frame`` over the concatenated, cleaned input: duplicate
+    ids are dropped across tasks, not only within one.
+    """
+    return _map_merge(_shard_partials, Aggregates(), sources, workers, usecols, aggregates)
+
+
+def parallel_sketches(sources, workers=None, columns=SKETCH_COLUMNS, usecols=ANALYSIS_COLUMNS):
+    """``sketch.QuantileSketches`` over ``sources``, built per task and merged."""
+    return _map_merge(_shard_sketches, QuantileSketches(columns), sources, workers, usecols,
+                      columns)
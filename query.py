@@ -0,0 +1,213 @@
+"""Filtered, column-pruned reads of the cached frame.
+
+Analyses used to load the whole cleaned frame and then take filtered copies
+of it (``df[df['state'] == 'failed'][[...]]``); those copies set the peak
+memory.  ``scan`` instead pushes the filter and the column selection down to
+the Feather file of the cache entry:
+
+* the file is memory-mapped and read one Arrow record batch
+  (``cache.BATCH_ROWS`` rows) at a time, and only the requested and filtered
+  columns of a batch are touched;
+* per-batch statistics (min/max of numeric columns, the labels present in
+  categorical ones) are computed once and kept next to the file, and batches
+  whose statistics cannot match the filter are skipped without being read;
+* rows are filtered with Arrow compute kernels before anything is converted
+  to pandas, so only matching rows are ever materialized.
+
+``where`` maps columns to a value or an iterable of values (``range`` works
+for years), as in ``cube.Cube.arrays``, or to a ``Between`` bound, which only
+the scans here understand.  ``aggregate``
+groups the scanned rows in Arrow and memoizes the result (see
+resultcache.py).  Both also work on any other file written
+by ``cache.write_columnar`` through ``scan_file`` (e.g. the campaign store).
+"""
+import os
+from collections import namedtuple
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from cache import CACHE_DIR, clean_entry, read_json, write_json
+from instrument import stage
+from loader import ANALYSIS_COLUMNS, CSV_PATH
+from resultcache import RESULTS
+
+
+# Inclusive bounds of a range filter; ``None`` leaves that side open.
+Between = namedtuple('Between', ['low', 'high'])
+
+MEASURES = ['backers_count', 'usd_goal', 'usd_pledged']
+
+# Categorical columns with more labels per batch than this get no label stats.
+MAX_LABELS = 64
+
+STATS_SUFFIX = '.stats.json'
+
+
+def _as_list(value):
+    if isinstance(value, (str, int, float, np.integer, np.floating)):
+        return [value]
+    return list(value)
+
+
+def _open(path):
+    return pa.ipc.open_file(pa.memory_map(path))
+
+
+def _column_stats(column):
+    if pa.types.is_dictionary(column.type):
+        present = column.dictionary.take(pc.unique(column.indices.drop_null()))
+        if len(present) <= MAX_LABELS:
+            return {'labels': sorted(present.to_pylist())}
+    elif pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        bounds = pc.min_max(column)
+        if bounds['min'].is_valid:
+            return {'min': bounds['min'].as_py(), 'max': bounds['max'].as_py()}
+    return None
+
+
+def batch_stats(path):
+    """Per-batch ``{'rows', 'columns': {column: stats}}`` of the Feather file ``path``.
+
+    Computed on first use and kept in a ``.stats.json`` file next to it,
+    which is recomputed when the file's size or mtime changes.
+    """
+    stat = os.stat(path)
+    stats_path = os.path.splitext(path)[0] + STATS_SUFFIX
+    memo = read_json(stats_path)
+    if memo and memo['size'] == stat.st_size and memo['mtime_ns'] == stat.st_mtime_ns:
+        return memo['batches']
+
+    reader = _open(path)
+    batches = []
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        columns = {}
+        for name, column in zip(batch.schema.names, batch.columns):
+            column_stats = _column_stats(column)
+            if column_stats is not None:
+                columns[name] = column_stats
+        batches.append({'rows': batch.num_rows, 'columns': columns})
+    write_json(stats_path, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                            'batches': batches})
+    return batches
+
+
+def _may_match(stats, column, condition):
+    # False only when the batch statistics rule out every row.
+    column_stats = stats['columns'].get(column)
+    if column_stats is None:
+        return True
+    if 'labels' in column_stats:
+        if isinstance(condition, Between):
+            return True
+        labels = set(column_stats['labels'])
+        return any(value in labels for value in _as_list(condition))
+    low, high = column_stats['min'], column_stats['max']
+    if isinstance(condition, Between):
+        return not ((condition.low is not None and high < condition.low)
+                    or (condition.high is not None and low > condition.high))
+    return any(low <= value <= high for value in _as_list(condition))
+
+
+def _mask(batch, where):
+    masks = []
+    for column, condition in where.items():
+        array = batch.column(column)
+        if isinstance(condition, Between):
+            if condition.low is not None:
+                masks.append(pc.greater_equal(array, condition.low))
+            if condition.high is not None:
+                masks.append(pc.less_equal(array, condition.high))
+        else:
+            masks.append(pc.is_in(array, value_set=pa.array(_as_list(condition))))
+    if not masks:
+        return None
+    return pc.fill_null(reduce(pc.and_, masks), False)
+
+
+def scan_table(path, columns=None, where=None):
+    """Arrow table of the rows of the Feather file ``path`` matching ``where``.
+
+    ``columns`` defaults to every column but the stored pandas index.
+    """
+    where = where or {}
+    reader = _open(path)
+    schema = reader.schema
+    if columns is None:
+        columns = [name for name in schema.names if not name.startswith('__index_level_')]
+    columns = list(columns)
+    needed = list(dict.fromkeys(columns + list(where)))
+    stats = batch_stats(path) if where else None
+
+    parts = []
+    with stage('query_scan') as s:
+        for i in range(reader.num_record_batches):
+            if stats and not all(_may_match(stats[i], column, condition)
+                                 for column, condition in where.items()):
+                continue
+            batch = reader.get_batch(i).select(needed)
+            mask = _mask(batch, where)
+            if mask is not None:
+                batch = batch.filter(mask)
+            parts.append(batch.select(columns))
+        result = pa.schema([schema.field(name) for name in columns], metadata=schema.metadata)
+        table = pa.Table.from_batches(parts, schema=result)
+        s.rows_out = table.num_rows
+    return table
+
+
+def scan_file(path, columns=None, where=None):
+    """``scan_table`` converted to a pandas frame (with a fresh ``RangeIndex``)."""
+    return scan_table(path, columns, where).to_pandas(split_blocks=True)
+
+
+def scan(path=CSV_PATH, columns=None, where=None, usecols=ANALYSIS_COLUMNS,
+         cache_dir=CACHE_DIR):
+    """Rows of the cleaned frame of ``path`` matching ``where``, only ``columns``.
+
+    E.g. ``scan(columns=['launch_to_deadline_days', 'category'],
+    where={'SuccessfulBool': 0})`` for the durations of failed campaigns.
+    """
+    return scan_file(clean_entry(path, usecols, cache_dir) + '.feather', columns, where)
+
+
+def aggregate_file(path, by=(), where=None, measures=MEASURES):
+    """Count and the sum and mean of ``measures`` per ``by`` group of the matching rows.
+
+    Groups without rows are left out; the frame is indexed like
+    ``cube.Cube.query``.
+    """
+    by, measures = list(by), list(measures)
+    table = scan_table(path, by + measures, where)
+    specs = [([], 'count_all')]
+    for col in measures:
+        specs += [(col, 'sum'), (col, 'mean')]
+    grouped = table.group_by(by).aggregate(specs).to_pandas()
+    grouped = grouped.rename(columns={'count_all': 'count'})
+    columns = ['count'] + [col + suffix for col in measures for suffix in ('_sum', '_mean')]
+    if not by:
+        # Arrow yields one row even when nothing matched; ``Cube.query`` yields none.
+        grouped = grouped[columns].set_axis(pd.Index(['all']))
+        return grouped[grouped['count'] > 0]
+    return grouped.set_index(by)[columns].sort_index()
+
+
+def aggregate(path=CSV_PATH, by=(), where=None, measures=MEASURES, usecols=ANALYSIS_COLUMNS,
+              cache_dir=CACHE_DIR, results=RESULTS):
+    """``aggregate_file`` over the cleaned frame of ``path``, memoized in ``results``.
+
+    Pass ``results=None`` to always scan.
+    """
+    entry = clean_entry(path, usecols, cache_dir)
+    if results is None:
+        return aggregate_file(entry + '.feather', by, where, measures)
+    # ``'US'`` and ``['US']`` filter the same rows, so they share one result.
+    where_key = {column: condition if isinstance(condition, Between) else _as_list(condition)
+                 for column, condition in (where or {}).items()}
+    params = {'by': list(by), 'where': where_key, 'measures': list(measures)}
+    return results.get_or_compute(os.path.basename(entry), 'aggregate', params,
+                                  lambda: aggregate_file(entry + '.feather', by, where, measures))
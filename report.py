@@ -0,0 +1,265 @@
+"""Headless batch renderer for the Kickstarter report.
+
+``build_report_data`` computes every aggregate the charts need once, from the
+cleaned frame, into a small picklable ``ReportData``.  ``render_report`` then
+renders each chart from it in its own worker process (Bokeh charts as
+standalone HTML, the seaborn/matplotlib charts as PNG through the
+object-oriented ``Figure`` API, so no notebook or pyplot state is involved)
+and writes everything plus an ``index.html`` to a static report directory.
+
+Plotting libraries are imported inside the render functions, so building the
+data does not pay for them.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cache import load_clean_frame
+from chartdata import ChartData, daily_series
+from crosstab import state_category_crosstab
+from incremental import Aggregates
+from instrument import current_config, init_worker, stage
+from sketch import QuantileSketches
+from timeseries import epoch_days
+
+
+REPORT_DIR = 'report'
+
+# Bump whenever ``build_report_data`` or ``streaming.stream_report_data``
+# change what they compute, so report data cached by cli.py is rebuilt.
+REPORT_VERSION = 2
+
+ReportData = namedtuple('ReportData', ['crosstab', 'aggregates', 'duration_box', 'daily',
+                                       'sketches'])
+
+
+def weighted_percentiles(values, weights, q):
+    """``np.percentile(np.repeat(values, weights), q)`` without expanding the repeats.
+
+    ``values`` must be sorted ascending and ``weights`` positive integers.
+    """
+    cum = np.cumsum(weights)
+    pos = np.asarray(q, dtype=np.float64) / 100 * (cum[-1] - 1)
+    lower = np.floor(pos)
+    below = values[np.searchsorted(cum, lower, side='right')]
+    above = values[np.searchsorted(cum, np.minimum(lower + 1, cum[-1] - 1), side='right')]
+    return below + (above - below) * (pos - lower)
+
+
+def box_stats(counts):
+    """Box-and-whisker stats (``matplotlib`` ``bxp`` format) per group.
+
+    ``counts`` is a Series of occurrence counts indexed by (group, value), as
+    kept by the exact histogram aggregates.  Whiskers reach the furthest value
+    within 1.5 IQR of the quartiles; the distinct values beyond them are the
+    fliers.
+    """
+    stats = []
+    for label, group in counts.groupby(level=0, sort=True):
+        values = group.index.get_level_values(1).to_numpy(dtype=np.float64)
+        order = np.argsort(values)
+        values = values[order]
+        q1, med, q3 = weighted_percentiles(values, group.to_numpy()[order], [25, 50, 75])
+        iqr = q3 - q1
+        lo = values[values >= q1 - 1.5 * iqr].min()
+        hi = values[values <= q3 + 1.5 * iqr].max()
+        stats.append({'label': label, 'med': med, 'q1': q1, 'q3': q3,
+                      'whislo': lo, 'whishi': hi,
+                      'fliers': values[(values < lo) | (values > hi)]})
+    return stats
+
+
+def build_report_data(df, registry=None):
+    """Every aggregate of the report, computed once from the cleaned frame.
+
+    ``registry`` is the ``encoding.DimensionRegistry`` the frame was encoded with.
+    """
+    with stage('crosstab', rows_in=len(df)):
+        crosstab = state_category_crosstab(df, registry)
+    with stage('aggregates', rows_in=len(df)):
+        aggregates = Aggregates.from_frame(df)
+    duration_box = box_stats(aggregates.duration_counts(0))
+    with stage('daily_series', rows_in=len(df)):
+        daily = daily_series(epoch_days(df))
+    with stage('sketches', rows_in=len(df)):
+        sketches = QuantileSketches.from_frame(df)
+    return ReportData(crosstab, aggregates, duration_box, daily, sketches)
+
+
+def median_notes(sketches):
+    """Lines quoting the approximate median goal and pledge of successful vs failed campaigns."""
+    notes = []
+    for column, label in [('usd_goal', 'goal'), ('usd_pledged', 'pledged')]:
+        medians = [sketches.combined(column, successful).quantile(0.5) for successful in (1, 0)]
+        notes.append('Median %s (USD): successful %.0f, failed %.0f' % (label, *medians))
+    return notes
+
+
+def _chart_data(data):
+    aggregates = data.aggregates
+    return ChartData(data.crosstab, aggregates.yearly_counts(),
+                     aggregates.yearly_counts('failed'),
+                     aggregates.yearly_counts('successful'), data.daily)
+
+
+def _save_bokeh(p, out_dir, name, title):
+    from bokeh.io import save
+    from bokeh.resources import CDN
+    path = os.path.join(out_dir, name + '.html')
+    save(p, filename=path, resources=CDN, title=title)
+    return path
+
+
+def _save_figure(fig, out_dir, name):
+    path = os.path.join(out_dir, name + '.png')
+    fig.savefig(path, bbox_inches='tight')
+    return path
+
+
+def render_bar(data, out_dir):
+    from figures import bar_figure
+    p = bar_figure(_chart_data(data).bar, data.crosstab.categories, data.crosstab.states)
+    return _save_bokeh(p, out_dir, 'bar', 'States of Kickstarter by Categories')
+
+
+def render_pie(data, out_dir):
+    from figures import pie_figure
+    return _save_bokeh(pie_figure(_chart_data(data).pie), out_dir, 'pie', 'Pie Chart')
+
+
+def render_line(data, out_dir):
+    from figures import line_figure
+    return _save_bokeh(line_figure(_chart_data(data).line), out_dir, 'line',
+                       'Total campaign vs Success/Failure rate')
+
+
+def render_daily(data, out_dir):
+    from figures import daily_figure
+    return _save_bokeh(daily_figure(_chart_data(data).daily_launches), out_dir, 'daily',
+                       'Campaigns launched per day')
+
+
+def render_heatmap(data, out_dir):
+    import matplotlib
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(15, 8))
+    ax = fig.subplots()
+    cmap = matplotlib.colormaps['RdYlGn'].with_extremes(bad='maroon')
+    sns.heatmap(data.aggregates.backers_mean_pivot(), cmap=cmap, ax=ax)
+    ax.set_title('Average Number of backers across Countries per category')
+    ax.set_xlabel('Country')
+    ax.set_ylabel('Category')
+    return _save_figure(fig, out_dir, 'heatmap')
+
+
+def render_histogram(data, out_dir):
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    counts = data.aggregates.monthly_counts().stack()
+    counts = counts.rename('count').reset_index()
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    # Precomputed counts enter as weights of one row per (month, state).
+    sns.histplot(data=counts, x='launched_at_month', hue='state', weights='count',
+                 bins=12, ax=ax)
+    ax.set_title('Number of campaigns launched in each month')
+    ax.set_xlabel('Launch Month')
+    ax.set_ylabel('Number of Campaigns')
+    return _save_figure(fig, out_dir, 'histogram')
+
+
+def render_boxplot(data, out_dir):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(15, 6))
+    ax = fig.subplots()
+    ax.bxp(data.duration_box, vert=False)
+    ax.set_title('Duration of campaign for all categories')
+    ax.set_xlabel('Length of campagin in days')
+    ax.set_ylabel('Categories')
+    return _save_figure(fig, out_dir, 'boxplot')
+
+
+def render_scatter(data, out_dir):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(15, 6))
+    ax = fig.subplots()
+    means = [data.aggregates.category_means(successful) for successful in (0, 1)]
+    max_backers = max(avg['backers_count'].max() for avg in means)
+    for avg, color, label in zip(means, ['r', 'g'], ['failed', 'successful']):
+        # Marker area grows with the average number of backers.
+        sizes = 20 + 300 * avg['backers_count'] / max_backers
+        ax.scatter(avg['usd_goal'], avg.index, s=sizes, c=color, alpha=0.7, label=label)
+    ax.legend()
+    ax.set_xlim(1, 150000)
+    ax.set_title('Average project goal(Successful/Failed) per category')
+    ax.set_xlabel('Average goal in USD')
+    ax.set_ylabel('Categories')
+    return _save_figure(fig, out_dir, 'scatter')
+
+
+CHARTS = {
+    'bar': render_bar,
+    'pie': render_pie,
+    'line': render_line,
+    'daily': render_daily,
+    'heatmap': render_heatmap,
+    'histogram': render_histogram,
+    'boxplot': render_boxplot,
+    'scatter': render_scatter,
+}
+
+
+def _render(name, data, out_dir):
+    with stage('render_' + name):
+        return name, CHARTS[name](data, out_dir)
+
+
+def write_index(paths, out_dir, notes=()):
+    """Static page linking the rendered charts, after ``notes`` (one paragraph each)."""
+    items = ['<p>%s</p>' % note for note in notes]
+    for name, path in paths.items():
+        file_name = os.path.basename(path)
+        if file_name.endswith('.png'):
+            items.append('<h2>%s</h2><img src="%s">' % (name, file_name))
+        else:
+            items.append('<h2>%s</h2><iframe src="%s" width="100%%" height="850" '
+                         'frameborder="0"></iframe>' % (name, file_name))
+    path = os.path.join(out_dir, 'index.html')
+    with open(path, 'w') as fh:
+        fh.write('<html><head><title>Kickstarter report</title></head><body>\n%s\n'
+                 '</body></html>\n' % '\n'.join(items))
+    return path
+
+
+def render_report(data=None, out_dir=REPORT_DIR, charts=None, workers=None):
+    """Render ``charts`` (all by default) into ``out_dir`` and return ``{name: path}``.
+
+    ``data`` defaults to the report data of the cached cleaned frame.  Charts
+    render in parallel worker processes unless ``workers`` is 1.
+    """
+    if data is None:
+        data = build_report_data(load_clean_frame())
+    charts = list(CHARTS) if charts is None else list(charts)
+    os.makedirs(out_dir, exist_ok=True)
+
+    if workers == 1:
+        paths = dict(_render(name, data, out_dir) for name in charts)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=current_config()) as pool:
+            futures = [pool.submit(_render, name, data, out_dir) for name in charts]
+            paths = dict(future.result() for future in futures)
+    write_index(paths, out_dir, median_notes(data.sketches))
+    return paths
+
+
+if __name__ == '__main__':
+    for chart, chart_path in render_report().items():
+        print(chart, chart_path)
@@ -0,0 +1,144 @@
+"""Memoized aggregate results keyed by dataset version and query parameters.
+
+Reports, the dashboard and the notebook ask for the same aggregates over and
+over.  ``ResultCache.get_or_compute`` serves them from an in-memory LRU
+bounded by the bytes of the results it holds, then from an optional disk
+tier of pickle files, and only computes a result on a miss.
+
+Keys combine the dataset version with the result name and the normalized
+parameters.  The version is the name of the cache entry (``dataset_version``),
+which covers the source digest, the cleaning version and the columns, so a
+changed CSV or pipeline never serves a stale result.  Normalizing makes
+equivalent spellings share one entry: dict order, list vs tuple, a ``range``
+and its values, numpy vs Python scalars.  On-disk results are written next to
+the cache entry they were computed from and pruned with it; results computed
+without building the entry should take their version from
+``cache.artifact_entry``, which registers it.
+
+Cached results are shared between callers; treat them as read-only.
+"""
+import hashlib
+import os
+import pickle
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cache import CACHE_DIR, entry_path
+from loader import ANALYSIS_COLUMNS, CSV_PATH
+
+
+MAX_BYTES = 256 << 20
+
+
+def dataset_version(path=CSV_PATH, usecols=ANALYSIS_COLUMNS, cache_dir=CACHE_DIR):
+    """Version of the cleaned frame of ``path``: the name of its cache entry."""
+    return os.path.basename(entry_path(path, usecols, cache_dir))
+
+
+def normalize(value):
+    """Hashable canonical form of query parameters."""
+    if isinstance(value, dict):
+        return tuple(sorted(((str(k), normalize(v)) for k, v in value.items())))
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        return (type(value).__name__,) + tuple(normalize(v) for v in value)
+    if isinstance(value, (list, tuple, range)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((normalize(v) for v in value), key=repr))
+    if isinstance(value, np.ndarray):
+        return normalize(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def result_key(version, name, params=None):
+    """Digest identifying the result ``name`` of ``params`` on dataset ``version``."""
+    raw = repr((version, name, normalize(params or {})))
+    return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+
+def nbytes(value):
+    """Approximate memory held by a result."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(nbytes(k) + nbytes(v) for k, v in value.items())
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + nbytes(vars(value))
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Byte-bounded LRU of results, with an optional pickle tier in ``disk_dir``."""
+
+    def __init__(self, max_bytes=MAX_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        # key -> (result, bytes), least recently used first
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _disk_path(self, version, key):
+        # Named after the cache entry so ``cache._prune`` removes it with the entry.
+        return os.path.join(self.disk_dir, '%s.result-%s.pkl' % (version, key))
+
+    def _remember(self, key, result):
+        size = nbytes(result)
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (result, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def get_or_compute(self, version, name, params, compute):
+        """The result ``name`` of ``params`` on ``version``, calling ``compute()`` on a miss."""
+        key = result_key(version, name, params)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        path = self._disk_path(version, key) if self.disk_dir else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as fh:
+                result = pickle.load(fh)
+            self.disk_hits += 1
+        else:
+            result = compute()
+            self.misses += 1
+            if path:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                tmp = path + '.tmp'
+                with open(tmp, 'wb') as fh:
+                    pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+        self._remember(key, result)
+        return result
+
+    def clear(self):
+        """Drop the in-memory tier (on-disk results are kept)."""
+        self._entries.clear()
+        self.bytes = 0
+
+
+# Process-wide in-memory cache used by default.
+RESULTS = ResultCache()
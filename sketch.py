@@ -0,0 +1,177 @@
+"""Mergeable streaming quantile sketches (KLL).
+
+A ``KLLSketch`` keeps a few hundred values in levels of compactors: values at
+level ``h`` stand for ``2**h`` original values.  When a level outgrows its
+capacity it is sorted and every other value (from a random offset) is
+promoted to the next level.  Memory stays O(k log(n / k)) and quantiles come
+with a rank error of about 1-2% for the default k=200.  Two sketches merge by
+concatenating their levels and compacting, so sketches built on different
+chunks or shards combine into the sketch of the whole input.
+
+``QuantileSketches`` keeps one sketch per (category, SuccessfulBool) and
+column and turns them into medians and box-and-whisker statistics.
+"""
+import numpy as np
+import pandas as pd
+
+
+SKETCH_COLUMNS = ['launch_to_deadline_days', 'usd_goal', 'usd_pledged']
+
+# Compaction offsets of ``QuantileSketches`` are drawn from this seed, so the
+# same input always gives the same quantiles.
+SEED = 0
+
+
+class KLLSketch:
+    """Approximate quantiles of a stream of floats in bounded memory."""
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(int(np.ceil(self.k * (2.0 / 3.0) ** depth)), 2)
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # Compact the whole level, except after a bulk update: then only
+                # the smallest values beyond capacity go, so the level stays full.
+                excess = max(len(level) - self._capacity(h), self._capacity(h))
+                excess = min(excess + excess % 2, len(level) - len(level) % 2)
+                promoted = level[self._rng.integers(2):excess:2]
+                self.levels[h] = level[excess:]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values):
+        """Add an array of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold ``other`` into this sketch."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def weighted_items(self):
+        """Retained values (sorted) and the number of inputs each stands for."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.int64)
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def quantiles(self, q):
+        """Approximate quantiles for fractions ``q`` (0 and 1 are the exact min/max)."""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.n:
+            return np.full(q.shape, np.nan)
+        values, weights = self.weighted_items()
+        cum = np.cumsum(weights)
+        idx = np.searchsorted(cum, q * cum[-1], side='left')
+        result = values[np.minimum(idx, len(values) - 1)]
+        result = np.where(q <= 0, self.min, result)
+        return np.where(q >= 1, self.max, result)
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+
+def sketch_box_stats(sketch, label=None):
+    """Box-and-whisker stats (``matplotlib`` ``bxp`` format) from a sketch.
+
+    Quartiles and whiskers carry the sketch's rank error; the fliers are the
+    retained values beyond the whiskers, i.e. a sample of the true fliers.
+    """
+    q1, med, q3 = sketch.quantiles([0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    values, _ = sketch.weighted_items()
+    values = np.concatenate([[sketch.min], values, [sketch.max]])
+    lo = values[values >= q1 - 1.5 * iqr].min()
+    hi = values[values <= q3 + 1.5 * iqr].max()
+    return {'label': label, 'med': med, 'q1': q1, 'q3': q3, 'whislo': lo, 'whishi': hi,
+            'fliers': np.unique(values[(values < lo) | (values > hi)])}
+
+
+class QuantileSketches:
+    """One ``KLLSketch`` per (category, SuccessfulBool) group and column."""
+
+    def __init__(self, columns=SKETCH_COLUMNS, k=200, seed=SEED):
+        self.columns = list(columns)
+        self.k = k
+        self.seed = seed
+        # (category, successful) -> {column: KLLSketch}
+        self.sketches = {}
+
+    def _group(self, key):
+        if key not in self.sketches:
+            self.sketches[key] = {col: KLLSketch(self.k, self.seed) for col in self.columns}
+        return self.sketches[key]
+
+    @classmethod
+    def from_frame(cls, df, columns=SKETCH_COLUMNS):
+        return cls(columns).update(df)
+
+    def update(self, df):
+        """Fold the rows of the cleaned frame ``df`` into the sketches."""
+        arrays = {col: df[col].to_numpy(dtype=np.float64) for col in self.columns}
+        groups = df.groupby(['category', 'SuccessfulBool'], observed=True).indices
+        for (category, successful), rows in groups.items():
+            group = self._group((str(category), int(successful)))
+            for col in self.columns:
+                group[col].update(arrays[col][rows])
+        return self
+
+    def merge(self, other):
+        for key, sketches in other.sketches.items():
+            group = self._group(key)
+            for col in self.columns:
+                group[col].merge(sketches[col])
+        return self
+
+    def combined(self, column, successful=None, category=None):
+        """Sketch of ``column`` merged over the matching groups."""
+        result = KLLSketch(self.k, self.seed)
+        for (cat, succ), sketches in self.sketches.items():
+            if (successful is None or succ == int(successful)) and \
+                    (category is None or cat == category):
+                result.merge(sketches[column])
+        return result
+
+    def medians(self, column, successful):
+        """Approximate median of ``column`` per category for failed (0) or successful (1)."""
+        return pd.Series({cat: sketches[column].quantile(0.5)
+                          for (cat, succ), sketches in sorted(self.sketches.items())
+                          if succ == int(successful)}, name=column)
+
+    def box_stats(self, column, successful):
+        """``bxp`` stats of ``column`` per category for failed (0) or successful (1)."""
+        return [sketch_box_stats(sketches[column], label=cat)
+                for (cat, succ), sketches in sorted(self.sketches.items())
+                if succ == int(successful)]
@@ -0,0 +1,148 @@
+"""Sparse two-dimensional aggregates, e.g. campaigns per category x country.
+
+The backers heatmap used to be a dense ``pivot_table`` that is mostly NaN:
+few countries have campaigns in every category, and by ``location`` there
+are hundreds of thousands of cells of which only a sliver is occupied.
+``SparseGrid`` keeps only the occupied cells, in coordinate form: the row
+and column code of each cell plus its campaign count and measure sum.  Means
+are one vectorized division over the occupied cells, the counts, sums and
+means are available as SciPy CSR matrices, and ``mean_frame`` densifies only
+the window of rows and columns that is actually rendered.
+
+Grids are built from registry codes (``from_frame``) or from the
+``incremental`` partials (``from_partial``) and merge by adding cells, like
+``cube.Cube``.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from encoding import DimensionRegistry
+
+
+def _reduce(row_codes, col_codes, counts, sums, shape):
+    # Occupied cells of the (row, column) pairs with their counts and sums added up.
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    flat = row_codes[valid].astype(np.int64) * shape[1] + col_codes[valid]
+    keys, inverse = np.unique(flat, return_inverse=True)
+    return (keys // max(shape[1], 1), keys % max(shape[1], 1),
+            np.bincount(inverse, weights=counts[valid], minlength=len(keys)).astype(np.int64),
+            np.bincount(inverse, weights=sums[valid], minlength=len(keys)))
+
+
+def _window(labels, wanted):
+    # Window position of every code (-1 outside the window).
+    positions = {label: i for i, label in enumerate(labels)}
+    window = np.full(len(labels), -1, dtype=np.int64)
+    for j, label in enumerate(wanted):
+        if label in positions:
+            window[positions[label]] = j
+    return window
+
+
+class SparseGrid:
+    """Campaign counts and measure sums per occupied cell of two dimensions."""
+
+    def __init__(self, labels, rows, cols, counts, sums):
+        # dimension -> labels along that axis; the first dimension is the rows
+        self.labels = labels
+        self.dimensions = list(labels)
+        self.rows = rows
+        self.cols = cols
+        self.counts = counts
+        self.sums = sums
+
+    @property
+    def shape(self):
+        return tuple(len(self.labels[dim]) for dim in self.dimensions)
+
+    @property
+    def nnz(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_frame(cls, df, rows='category', columns='country', measure='backers_count',
+                   registry=None):
+        """Grid of ``measure`` over ``rows`` x ``columns`` of the cleaned frame ``df``."""
+        registry = registry or DimensionRegistry()
+        row_codes = registry.codes(df, rows)
+        col_codes = registry.codes(df, columns)
+        labels = {rows: list(registry[rows].labels), columns: list(registry[columns].labels)}
+        shape = (len(labels[rows]), len(labels[columns]))
+        return cls(labels, *_reduce(row_codes, col_codes, np.ones(len(df)),
+                                    df[measure].to_numpy(dtype=np.float64), shape))
+
+    @classmethod
+    def from_partial(cls, part, measure):
+        """Grid of an ``incremental`` partial indexed by (rows, columns)."""
+        index = part.index.remove_unused_levels()
+        labels = {index.names[i]: list(index.levels[i]) for i in range(2)}
+        shape = tuple(len(level) for level in index.levels)
+        return cls(labels, *_reduce(index.codes[0], index.codes[1],
+                                    part['count'].to_numpy(dtype=np.float64),
+                                    part[measure + '_sum'].to_numpy(dtype=np.float64), shape))
+
+    def merge(self, other):
+        """Add the cells of ``other`` (same dimensions, labels are unioned) to this grid."""
+        if other.dimensions != self.dimensions:
+            raise ValueError('cannot merge grids over %r and %r'
+                             % (self.dimensions, other.dimensions))
+        labels, codes = {}, []
+        for axis, dim in enumerate(self.dimensions):
+            known = set(self.labels[dim])
+            labels[dim] = list(self.labels[dim]) + [
+                label for label in other.labels[dim] if label not in known]
+            positions = {label: i for i, label in enumerate(labels[dim])}
+            remap = np.array([positions[label] for label in other.labels[dim]], dtype=np.int64)
+            mine, theirs = (self.rows, other.rows) if axis == 0 else (self.cols, other.cols)
+            codes.append(np.concatenate([mine, remap[theirs]]))
+        shape = tuple(len(labels[dim]) for dim in self.dimensions)
+        self.__init__(labels, *_reduce(codes[0], codes[1],
+                                       np.concatenate([self.counts, other.counts]),
+                                       np.concatenate([self.sums, other.sums]), shape))
+        return self
+
+    def _matrix(self, data):
+        return sparse.csr_matrix((data, (self.rows, self.cols)), shape=self.shape)
+
+    def count_matrix(self):
+        return self._matrix(self.counts)
+
+    def sum_matrix(self):
+        return self._matrix(self.sums)
+
+    def cell_means(self):
+        """Mean of the measure in every occupied cell (aligned with ``rows``/``cols``)."""
+        return self.sums / self.counts
+
+    def mean_matrix(self):
+        """CSR matrix of the cell means; empty cells are not stored (not zero)."""
+        return self._matrix(self.cell_means())
+
+    def occupied(self, dim):
+        """Labels of ``dim`` with at least one campaign, in label order."""
+        codes = self.rows if dim == self.dimensions[0] else self.cols
+        return [self.labels[dim][i] for i in np.unique(codes)]
+
+    def top_labels(self, dim, n):
+        """The ``n`` labels of ``dim`` with the most campaigns, most first."""
+        codes = self.rows if dim == self.dimensions[0] else self.cols
+        totals = np.bincount(codes, weights=self.counts, minlength=len(self.labels[dim]))
+        order = np.argsort(-totals, kind='stable')[:n]
+        return [self.labels[dim][i] for i in order if totals[i] > 0]
+
+    def mean_frame(self, rows=None, columns=None):
+        """Dense frame of the means in the ``rows`` x ``columns`` window (NaN where empty).
+
+        Both default to the occupied labels; only the window is allocated.
+        """
+        row_dim, col_dim = self.dimensions
+        rows = self.occupied(row_dim) if rows is None else list(rows)
+        columns = self.occupied(col_dim) if columns is None else list(columns)
+        row_window = _window(self.labels[row_dim], rows)[self.rows]
+        col_window = _window(self.labels[col_dim], columns)[self.cols]
+        inside = (row_window >= 0) & (col_window >= 0)
+        values = np.full((len(rows), len(columns)), np.nan)
+        values[row_window[inside], col_window[inside]] = self.cell_means()[inside]
+        return pd.DataFrame(values, index=pd.Index(rows, name=row_dim),
+                            columns=pd.Index(columns, name=col_dim))
@@ -0,0 +1,253 @@
+"""Campaign store keyed by ``id`` for merging overlapping snapshots.
+
+    python store.py SNAPSHOT.csv [SNAPSHOT.csv ...]   # upsert snapshots into the store
+
+Every API pull returns many campaigns that earlier pulls already had.
+``CampaignStore`` keeps one row per campaign, the latest snapshot by
+``state_changed_at``: ``upsert`` replaces the stored row of a campaign in
+place when the batch has a snapshot at least as recent, and appends
+campaigns it has not seen.  Within a batch, older snapshots are dropped with
+``cleaning.superseded`` first.
+
+Rows are found through ``IdIndex``, an open-addressing hash table (linear
+probing, Fibonacci hashing) stored in two numpy arrays.  Batch lookups and
+inserts probe all keys at once, one vectorized round per probe step, and a
+single campaign is found in O(1) without touching the frame.  The frame is
+saved as Feather and the index as ``.npz`` next to it, so reopening the
+store does not rehash anything.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import CACHE_DIR, read_columnar, write_columnar
+from cleaning import superseded
+from loader import ANALYSIS_COLUMNS, load_kickstarter
+
+
+STORE_PATH = os.path.join(CACHE_DIR, 'campaigns')
+
+VERSION_COLUMN = 'state_changed_at_ts'
+
+# Key of an unused slot (no campaign id is negative).
+EMPTY = np.iinfo(np.int64).min
+
+# 2**64 / golden ratio, the Fibonacci hashing multiplier.
+_FIBONACCI = np.uint64(0x9E3779B97F4A7C15)
+
+
+class IdIndex:
+    """Open-addressing hash table from campaign id to row number."""
+
+    def __init__(self, capacity=1024):
+        capacity = 1 << max(int(capacity - 1).bit_length(), 4)
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.rows = np.full(capacity, -1, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _slots(self, ids):
+        bits = len(self.keys).bit_length() - 1
+        hashed = ids.astype(np.uint64) * _FIBONACCI
+        return (hashed >> np.uint64(64 - bits)).astype(np.int64)
+
+    def lookup(self, ids):
+        """Row of every id (-1 for ids that are not in the index)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.full(len(ids), -1, dtype=np.int64)
+        pending = np.arange(len(ids))
+        slots = self._slots(ids)
+        mask = len(self.keys) - 1
+        while len(pending):
+            keys = self.keys[slots]
+            found = keys == ids[pending]
+            result[pending[found]] = self.rows[slots[found]]
+            probe = ~found & (keys != EMPTY)
+            pending, slots = pending[probe], (slots[probe] + 1) & mask
+        return result
+
+    def get(self, campaign_id, default=-1):
+        """Row of one id, probing the table directly."""
+        mask = len(self.keys) - 1
+        slot = int(self._slots(np.array([campaign_id], dtype=np.int64))[0])
+        while True:
+            key = self.keys[slot]
+            if key == campaign_id:
+                return int(self.rows[slot])
+            if key == EMPTY:
+                return default
+            slot = (slot + 1) & mask
+
+    def insert(self, ids, rows):
+        """Map each of the distinct ``ids`` to its row, replacing existing entries."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        # Keep the load factor at or below one half.
+        if 2 * (self.size + len(ids)) > len(self.keys):
+            self._resize(2 * (self.size + len(ids)))
+        pending = np.arange(len(ids))
+        slots = self._slots(ids)
+        mask = len(self.keys) - 1
+        while len(pending):
+            keys = self.keys[slots]
+            done = keys == ids[pending]
+            self.rows[slots[done]] = rows[pending[done]]
+            # Several ids may probe the same empty slot; the first one claims it.
+            empty = np.flatnonzero(keys == EMPTY)
+            _, first = np.unique(slots[empty], return_index=True)
+            claimed = empty[first]
+            self.keys[slots[claimed]] = ids[pending[claimed]]
+            self.rows[slots[claimed]] = rows[pending[claimed]]
+            self.size += len(claimed)
+            done[claimed] = True
+            pending, slots = pending[~done], (slots[~done] + 1) & mask
+
+    def _resize(self, capacity):
+        used = self.keys != EMPTY
+        keys, rows = self.keys[used], self.rows[used]
+        self.__init__(capacity)
+        self.insert(keys, rows)
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, keys=self.keys, rows=self.rows, size=np.array(self.size))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls.__new__(cls)
+        with np.load(path) as data:
+            index.keys = data['keys']
+            index.rows = data['rows']
+            index.size = int(data['size'])
+        return index
+
+
+def _unify_categories(frame, batch):
+    # Give the categorical columns of ``batch`` the categories of ``frame``
+    # (extended as needed), so assignment and concatenation keep them
+    # categorical.
+    for col in frame.columns:
+        if col not in batch.columns or not isinstance(frame[col].dtype, pd.CategoricalDtype):
+            continue
+        extra = pd.Index(batch[col].dropna().unique()).difference(frame[col].cat.categories)
+        if len(extra):
+            frame[col] = frame[col].cat.add_categories(extra)
+        batch[col] = pd.Categorical(batch[col], categories=frame[col].cat.categories)
+
+
+class CampaignStore:
+    """The latest snapshot of every campaign, indexed by ``id``."""
+
+    def __init__(self, frame=None, index=None):
+        self.frame = frame if frame is not None else pd.DataFrame()
+        self.index = index if index is not None else IdIndex()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __contains__(self, campaign_id):
+        return self.index.get(campaign_id) >= 0
+
+    @classmethod
+    def from_frame(cls, df):
+        store = cls()
+        store.upsert(df)
+        return store
+
+    def get(self, campaign_id):
+        """The stored row of one campaign; raises ``KeyError`` if it is unknown."""
+        row = self.index.get(campaign_id)
+        if row < 0:
+            raise KeyError(campaign_id)
+        return self.frame.iloc[row]
+
+    def rows(self, ids):
+        """The stored rows of ``ids`` (in that order); raises ``KeyError`` for unknown ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = self.index.lookup(ids)
+        if (rows < 0).any():
+            raise KeyError('campaigns not in the store: %s' % ids[rows < 0][:10].tolist())
+        return self.frame.iloc[rows]
+
+    def match(self, df):
+        """``(batch, rows, update)`` of a snapshot batch, without changing the store.
+
+        ``batch`` is ``df`` without superseded snapshots, ``rows`` the stored
+        row of each of its campaigns (-1 for new ones) and ``update`` marks
+        the campaigns whose stored snapshot it replaces, i.e. is not newer.
+        """
+        batch = df[~superseded(df)].reset_index(drop=True)
+        rows = self.index.lookup(batch['id'].to_numpy(dtype=np.int64))
+        known = rows >= 0
+        update = known.copy()
+        if VERSION_COLUMN in batch.columns and VERSION_COLUMN in self.frame.columns:
+            stored = self.frame[VERSION_COLUMN].to_numpy()[rows[known]]
+            update[known] = batch[VERSION_COLUMN].to_numpy()[known] >= stored
+        return batch, rows, update
+
+    def apply(self, batch, rows, update):
+        """Write a ``match`` result; returns ``(inserted, updated)`` campaign counts."""
+        if len(self.frame):
+            _unify_categories(self.frame, batch)
+
+        if update.any():
+            positions = rows[update]
+            changed = batch.iloc[np.flatnonzero(update)]
+            for j, col in enumerate(self.frame.columns):
+                if col in changed.columns:
+                    values = changed[col].astype(self.frame[col].dtype).to_numpy()
+                    self.frame.iloc[positions, j] = values
+
+        new = np.flatnonzero(rows < 0)
+        if len(new):
+            start = len(self.frame)
+            added = batch.iloc[new]
+            self.frame = (pd.concat([self.frame, added], ignore_index=True) if start
+                          else added.reset_index(drop=True))
+            self.index.insert(batch['id'].to_numpy(dtype=np.int64)[new],
+                              start + np.arange(len(new)))
+        return len(new), int(update.sum())
+
+    def upsert(self, df):
+        """Merge a snapshot batch; returns ``(inserted, updated)`` campaign counts.
+
+        Stored campaigns are replaced in place unless their stored snapshot
+        is newer than the batch's.
+        """
+        return self.apply(*self.match(df))
+
+    def save(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        write_columnar(self.frame, path + '.feather')
+        self.index.save(path + '.index.npz')
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        """The saved store at ``path`` (empty if there is none yet)."""
+        if not os.path.exists(path + '.feather'):
+            return cls()
+        # Upserts write into the frame, so it is copied out of the memory map.
+        frame = read_columnar(path + '.feather').copy()
+        return cls(frame, IdIndex.load(path + '.index.npz'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge Kickstarter snapshots by campaign id')
+    parser.add_argument('snapshots', nargs='+', help='snapshot CSVs, oldest first')
+    parser.add_argument('--store', default=STORE_PATH, help='store path (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    store = CampaignStore.load(args.store)
+    for path in args.snapshots:
+        inserted, updated = store.upsert(load_kickstarter(path, usecols=ANALYSIS_COLUMNS))
+        print('%s: %d new, %d updated, %d campaigns' % (path, inserted, updated, len(store)))
+    store.save(args.store)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Out-of-core report mode: every report aggregate computed over CSV chunks.
+
+The CSV is read with ``loader.iter_kickstarter``; each chunk is cleaned with
+the same rules as the in-memory frame and folded into the mergeable partials
+of ``incremental`` (category/state counts, yearly and monthly counts per
+state, the country x category backers mean, the per-category goal/backers
+means and the duration histogram behind the boxplot), the quantile sketches
+of ``sketch`` and a per-day launch count.  Only one chunk and the partial
+tables are held in memory, so the report runs on dumps much larger than RAM
+and produces the same ``report.ReportData`` as the in-memory path.
+
+Older snapshots of a campaign may sit in a different chunk than the latest
+one, so a first pass reads only ``id`` and ``state_changed_at`` and writes
+them to hash partitions on disk (``cleaning.SnapshotPartitions``); the
+superseded rows are then found one partition at a time.  Besides a chunk,
+that pass holds one partition and the positions of the superseded rows.
+"""
+import itertools
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from chartdata import daily_counts, decimate
+from cleaning import SNAPSHOT_COLUMNS, SnapshotPartitions, clean_kickstarter, position_mask
+from crosstab import crosstab_from_counts
+from encoding import DimensionRegistry
+from incremental import AGGREGATES, Aggregates, compute_partials
+from instrument import stage
+from loader import ANALYSIS_COLUMNS, CSV_PATH, iter_kickstarter
+from report import ReportData, box_stats
+from sketch import QuantileSketches
+from timeseries import epoch_days
+
+
+CHUNKSIZE = 500000
+
+
+def _superseded_chunks(path, chunksize, usecols):
+    # Per chunk, the rows replaced by a later snapshot anywhere in the CSV.
+    columns = [col for col in SNAPSHOT_COLUMNS if usecols is None or col in usecols]
+    if 'id' not in columns:
+        return itertools.repeat(None)
+    sizes = []
+    with stage('stream_snapshots') as s, tempfile.TemporaryDirectory() as directory:
+        snapshots = SnapshotPartitions(directory, os.path.getsize(path))
+        for chunk in iter_kickstarter(path, usecols=columns, chunksize=chunksize):
+            snapshots.add(chunk, sum(sizes))
+            sizes.append(len(chunk))
+        dropped = snapshots.superseded_positions()
+        s.rows_out = sum(sizes)
+    offsets = np.cumsum([0] + sizes)
+    return (position_mask(dropped, offset, n) for offset, n in zip(offsets, sizes))
+
+
+def stream_aggregates(path=CSV_PATH, chunksize=CHUNKSIZE, usecols=ANALYSIS_COLUMNS,
+                      aggregates=AGGREGATES):
+    """``(Aggregates, QuantileSketches, daily)`` folded chunk by chunk over the cleaned CSV.
+
+    ``daily`` is a Series of launches per calendar day.
+    """
+    result = Aggregates()
+    sketches = QuantileSketches()
+    days, counts = daily_counts([])
+    daily = pd.Series(counts, index=days)
+    chunks = iter_kickstarter(path, usecols=usecols, chunksize=chunksize)
+    for chunk, drop in zip(chunks, _superseded_chunks(path, chunksize, usecols)):
+        with stage('stream_chunk', rows_in=len(chunk)) as s:
+            chunk = clean_kickstarter(chunk, drop=drop)
+            result.merge(compute_partials(chunk, aggregates))
+            sketches.update(chunk)
+            days, counts = daily_counts(epoch_days(chunk))
+            part = pd.Series(counts, index=days)
+            daily = daily.add(part, fill_value=0)
+            s.rows_out = len(chunk)
+    return result, sketches, daily
+
+
+def stream_report_data(path=CSV_PATH, chunksize=CHUNKSIZE, registry=None):
+    """``report.ReportData`` computed in bounded memory from the CSV at ``path``."""
+    registry = registry or DimensionRegistry()
+    aggregates, sketches, daily = stream_aggregates(path, chunksize)
+    # Chunks only count the days they contain; zero-fill the gaps in between.
+    daily = daily.asfreq('D', fill_value=0)
+    return ReportData(
+        crosstab=crosstab_from_counts(aggregates.state_category_counts(), registry),
+        aggregates=aggregates,
+        duration_box=box_stats(aggregates.duration_counts(0)),
+        daily=decimate(daily.index.to_numpy(), daily.to_numpy()),
+        sketches=sketches,
+    )
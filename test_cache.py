@@ -0,0 +1,46 @@
+import os
+
+from bench import synthetic_frame
+from cache import CACHE_DIR, artifact_entry, load_clean_frame
+from query import aggregate
+from resultcache import ResultCache
+
+
+def _query(path):
+    failed = aggregate(path, by=['category'], where={'state': 'failed'}, results=None)
+    assert failed['count'].sum() > 0
+
+
+def test_reload_after_query_and_source_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'campaigns.csv')
+    for seed in range(3):
+        synthetic_frame(2000 + seed, seed=seed).to_csv(path, index=False)
+        df = load_clean_frame(path)
+        assert len(df) == aggregate(path, results=None)['count'].sum()
+        _query(path)
+    # A rebuild while the current entry has query artifacts next to it.
+    assert len(load_clean_frame(path, usecols=['id', 'name', 'name_len', 'state']))
+    entries = [name for name in os.listdir(CACHE_DIR)
+               if name.startswith('campaigns-') and name.endswith('.feather')]
+    assert len(entries) == 2
+
+
+def test_aggregate_leaves_out_empty_groups(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'campaigns.csv')
+    synthetic_frame(500, seed=0).to_csv(path, index=False)
+    for by in ([], ['category']):
+        assert aggregate(path, by=by, where={'country': 'nowhere'}, results=None).empty
+
+
+def test_results_of_an_unbuilt_entry_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'campaigns.csv')
+    results = ResultCache(disk_dir=CACHE_DIR)
+    for seed in range(2):
+        synthetic_frame(500, seed=seed).to_csv(path, index=False)
+        version = os.path.basename(artifact_entry(path))
+        results.get_or_compute(version, 'rows', None, lambda: seed)
+    pickles = [name for name in os.listdir(CACHE_DIR) if '.result-' in name]
+    assert pickles and all(name.startswith(version + '.') for name in pickles)
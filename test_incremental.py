@@ -0,0 +1,39 @@
+import pandas as pd
+
+from bench import synthetic_frame
+from cleaning import clean_kickstarter
+from incremental import AggregateStore, Aggregates
+from loader import load_kickstarter
+
+
+def _assert_same(store, expected):
+    for name, part in Aggregates.from_frame(expected).partials.items():
+        pd.testing.assert_frame_equal(store.partials[name], part, check_dtype=False)
+
+
+def test_fold_keeps_the_latest_snapshot(tmp_path):
+    path = str(tmp_path / 'campaigns.csv')
+    synthetic_frame(2000, seed=0).to_csv(path, index=False)
+    df = clean_kickstarter(load_kickstarter(path)).reset_index(drop=True)
+
+    newer = df.iloc[:200].copy()
+    newer['state_changed_at_ts'] += 1000
+    newer['backers_count'] += 5
+    older = df.iloc[200:400].copy()
+    older['state_changed_at_ts'] -= 1000
+    older['backers_count'] += 9
+
+    store = AggregateStore()
+    store.fold(df.iloc[:1500])
+    # Newer snapshots listed before the rows they replace still win.
+    store.fold(pd.concat([newer, df.iloc[1500:], df.iloc[:200]]))
+    # Older snapshots of stored campaigns are ignored.
+    store.fold(older)
+
+    expected = df.copy()
+    expected.iloc[:200] = newer
+    _assert_same(store, expected)
+    assert len(store) == len(df)
+
+    store.save(str(tmp_path / 'aggregates.pkl'))
+    _assert_same(AggregateStore.load(str(tmp_path / 'aggregates.pkl')), expected)
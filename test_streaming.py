@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import synthetic_frame
+from cleaning import clean_kickstarter
+from loader import load_kickstarter
+from report import build_report_data
+from streaming import stream_report_data
+
+
+@pytest.mark.parametrize('rows', ['none', 'all_dropped', 'some'])
+def test_stream_matches_in_memory(tmp_path, rows):
+    df = synthetic_frame(500, seed=0)
+    if rows == 'none':
+        df = df.iloc[:0]
+    elif rows == 'all_dropped':
+        df['name_len'] = 0
+    path = str(tmp_path / 'campaigns.csv')
+    df.to_csv(path, index=False)
+
+    streamed = stream_report_data(path, chunksize=100)
+    in_memory = build_report_data(clean_kickstarter(load_kickstarter(path)))
+    assert all(np.array_equal(a, b) for a, b in zip(streamed.daily, in_memory.daily))
+    assert np.array_equal(streamed.crosstab.counts, in_memory.crosstab.counts)
+    assert len(streamed.duration_box) == len(in_memory.duration_box)
+
+
+def test_duplicate_ids_across_chunks_and_shards(tmp_path, monkeypatch):
+    import cleaning
+    from incremental import Aggregates
+    from parallel import parallel_aggregates
+    from streaming import stream_aggregates
+
+    # Several partitions even for a small file.
+    monkeypatch.setattr(cleaning, 'PARTITION_ROWS', 100)
+    df = synthetic_frame(1000, seed=0)
+    repeats = df.iloc[100:300].copy()
+    repeats['backers_count'] += 7
+    # Half the repeats are older snapshots than the rows they repeat.
+    repeats.loc[repeats.index[::2], 'state_changed_at'] = '2000-01-01 00:00:00'
+    path = str(tmp_path / 'campaigns.csv')
+    pd.concat([df, repeats]).to_csv(path, index=False)
+
+    expected = Aggregates.from_frame(clean_kickstarter(load_kickstarter(path)))
+    streamed, _, _ = stream_aggregates(path, chunksize=300)
+    for result in (streamed, parallel_aggregates(path, workers=1),
+                   parallel_aggregates(path, workers=2)):
+        for name, part in expected.partials.items():
+            pd.testing.assert_frame_equal(result.partials[name], part, check_dtype=False)
@@ -0,0 +1,256 @@
+"""Hashed n-gram features of the ``name`` and ``blurb`` texts.
+
+Texts are tokenized with Arrow compute kernels (lower-case, split on anything
+that is not a Unicode letter, mark or digit) and flattened into one array of
+tokens; tokens are hashed with ``pd.util.hash_array`` and bigrams are formed
+by combining the hashes of neighbouring tokens, so no Python code runs per
+token.  Each feature is its hash modulo ``N_FEATURES``, and a batch becomes a
+SciPy CSR matrix of n-gram counts (one row per campaign).  Batches are
+tokenized in a process pool.
+
+``TextFeatureCache`` keeps the matrix of one field on disk, keyed by campaign
+``id`` together with a hash of the text, so a nightly run only tokenizes new
+or edited campaigns.  ``term_associations`` turns a matrix into per-category
+term/success tables.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy import sparse
+
+from cache import CACHE_DIR
+from cleaning import superseded
+
+
+TEXT_FIELDS = ['name', 'blurb']
+
+N_FEATURES = 2 ** 20
+BATCH_SIZE = 100000
+
+TEXT_CACHE_DIR = os.path.join(CACHE_DIR, 'text')
+
+# Columns ``cleaning.superseded`` orders the snapshots of a campaign by.
+SNAPSHOT_KEYS = ['id', 'state_changed_at_ts']
+
+# Bump when tokenization changes, so cached matrices are rebuilt.
+TOKENIZER_VERSION = 2
+
+# Odd multiplier mixing the two token hashes of a bigram.
+_BIGRAM_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _tokens(texts):
+    # (row of each token, tokens) for a Series of texts, in reading order.
+    texts = pa.array(texts.fillna('').astype(str).to_numpy(dtype=object), type=pa.string())
+    words = pc.utf8_split_whitespace(
+        pc.replace_substring_regex(pc.utf8_lower(texts), r'[^\p{L}\p{M}\p{N}]+', ' '))
+    lengths = pc.list_value_length(words).to_numpy(zero_copy_only=False)
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    tokens = pc.list_flatten(words).to_numpy(zero_copy_only=False)
+    # Leading/trailing separators leave empty tokens behind.
+    keep = tokens != ''
+    return rows[keep], tokens[keep]
+
+
+def hash_ngrams(texts, ngrams=2, n_features=N_FEATURES, vocabulary=True):
+    """``(matrix, vocabulary)`` of 1..``ngrams``-gram counts of ``texts``.
+
+    ``matrix`` is a ``len(texts) x n_features`` CSR matrix; ``vocabulary``
+    maps each feature that occurs to one n-gram hashed into it, and is left
+    empty with ``vocabulary=False`` (e.g. when only scoring).
+    """
+    texts = pd.Series(texts).reset_index(drop=True)
+    rows, tokens = _tokens(texts)
+    hashes = pd.util.hash_array(tokens)
+    all_rows, all_hashes, all_terms = [rows], [hashes], [tokens]
+    for n in range(2, ngrams + 1):
+        # An n-gram starts at every token followed by n - 1 tokens of the same text.
+        start = np.flatnonzero(rows[:len(rows) - n + 1] == rows[n - 1:])
+        combined = hashes[start]
+        for k in range(1, n):
+            combined = combined * _BIGRAM_MIX ^ hashes[start + k]
+        all_rows.append(rows[start])
+        all_hashes.append(combined)
+        all_terms.append((start, n))
+
+    features = np.concatenate(all_hashes) % np.uint64(n_features)
+    features = features.astype(np.int64)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(features), dtype=np.float32), (np.concatenate(all_rows), features)),
+        shape=(len(texts), n_features))
+    matrix.sum_duplicates()
+    if not vocabulary:
+        return matrix, {}
+
+    # Name each feature after the first n-gram hashed into it; only the
+    # distinct features are turned back into strings.
+    unique, first = np.unique(features, return_index=True)
+    offsets = np.cumsum([0] + [len(h) for h in all_hashes])
+    part = np.searchsorted(offsets, first, side='right') - 1
+    terms = np.empty(len(unique), dtype=object)
+    for n, ngram_terms in enumerate(all_terms, start=1):
+        selected = part == n - 1
+        index = first[selected] - offsets[n - 1]
+        if n == 1:
+            terms[selected] = ngram_terms[index]
+        else:
+            start = ngram_terms[0][index]
+            words = pd.Series(tokens[start])
+            terms[selected] = words.str.cat([pd.Series(tokens[start + k]) for k in range(1, n)],
+                                            sep=' ').to_numpy()
+    return matrix, dict(zip(unique.tolist(), terms.tolist()))
+
+
+def _hash_batch(task):
+    texts, ngrams, n_features, vocabulary = task
+    return hash_ngrams(texts, ngrams, n_features, vocabulary)
+
+
+def text_matrix(texts, workers=None, batch_size=BATCH_SIZE, ngrams=2, n_features=N_FEATURES,
+                vocabulary=True):
+    """``hash_ngrams`` of ``texts`` computed in batches across ``workers`` processes."""
+    texts = pd.Series(texts).reset_index(drop=True)
+    tasks = [(texts.iloc[start:start + batch_size], ngrams, n_features, vocabulary)
+             for start in range(0, len(texts), batch_size)]
+    if not tasks:
+        return sparse.csr_matrix((0, n_features), dtype=np.float32), {}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        results = [_hash_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_hash_batch, tasks))
+    vocabulary = {}
+    for _, batch_vocabulary in results:
+        for feature, term in batch_vocabulary.items():
+            vocabulary.setdefault(feature, term)
+    return sparse.vstack([matrix for matrix, _ in results], format='csr'), vocabulary
+
+
+class TextFeatureCache:
+    """On-disk n-gram matrix of one text field, keyed by campaign ``id``."""
+
+    def __init__(self, field, cache_dir=TEXT_CACHE_DIR, ngrams=2, n_features=N_FEATURES):
+        self.field = field
+        self.ngrams = ngrams
+        self.n_features = n_features
+        self.prefix = os.path.join(cache_dir, '%s-%dgram-%d-v%d' % (field, ngrams, n_features,
+                                                                   TOKENIZER_VERSION))
+        self.ids = np.empty(0, dtype=np.int64)
+        self.text_hashes = np.empty(0, dtype=np.uint64)
+        self.matrix = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.vocabulary = {}
+        if os.path.exists(self.prefix + '.npz'):
+            self._load()
+
+    def _load(self):
+        self.matrix = sparse.load_npz(self.prefix + '.npz').tocsr()
+        with np.load(self.prefix + '.keys.npz') as keys:
+            self.ids = keys['ids']
+            self.text_hashes = keys['text_hashes']
+        with open(self.prefix + '.vocabulary.json') as fh:
+            self.vocabulary = {int(feature): term for feature, term in json.load(fh).items()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.prefix), exist_ok=True)
+        tmp = self.prefix + '.tmp'
+        sparse.save_npz(tmp + '.npz', self.matrix, compressed=False)
+        np.savez(tmp + '.keys.npz', ids=self.ids, text_hashes=self.text_hashes)
+        with open(tmp + '.vocabulary.json', 'w') as fh:
+            json.dump(self.vocabulary, fh)
+        for suffix in ('.npz', '.keys.npz', '.vocabulary.json'):
+            os.replace(tmp + suffix, self.prefix + suffix)
+
+    def features(self, df, workers=None):
+        """Matrix rows for the campaigns of ``df`` (in ``df`` order).
+
+        Campaigns whose ``id`` is unknown or whose text changed are tokenized
+        and added to the cache, which is saved when anything was added.  Rows
+        of a campaign that a later snapshot in ``df`` supersedes (see
+        ``cleaning.superseded``) get the features of that snapshot.
+        """
+        ids = df['id'].to_numpy(dtype=np.int64)
+        texts = df[self.field].fillna('').astype(str)
+        text_hashes = pd.util.hash_array(texts.to_numpy(dtype=object))
+
+        rows = pd.Index(self.ids).get_indexer(ids)
+        stale = rows < 0
+        stale[~stale] = self.text_hashes[rows[~stale]] != text_hashes[~stale]
+        # Of several snapshots of a campaign, only the latest one is tokenized.
+        stale &= ~superseded(df[[col for col in SNAPSHOT_KEYS if col in df.columns]])
+        if stale.any():
+            new = np.flatnonzero(stale)
+            matrix, vocabulary = text_matrix(texts.iloc[new], workers,
+                                             ngrams=self.ngrams, n_features=self.n_features)
+            keep = ~np.isin(self.ids, ids[new])
+            self.matrix = sparse.vstack([self.matrix[keep], matrix], format='csr')
+            self.ids = np.concatenate([self.ids[keep], ids[new]])
+            self.text_hashes = np.concatenate([self.text_hashes[keep], text_hashes[new]])
+            for feature, term in vocabulary.items():
+                self.vocabulary.setdefault(feature, term)
+            self.save()
+            rows = pd.Index(self.ids).get_indexer(ids)
+        return self.matrix[rows]
+
+
+def term_associations(matrix, df, vocabulary=None, min_docs=20):
+    """Per-category success statistics of every term occurring in ``min_docs`` campaigns.
+
+    ``matrix`` rows align with ``df`` (which needs ``category`` and
+    ``SuccessfulBool``).  Returns one row per (category, feature) with the
+    number of campaigns using the term, how many of them succeeded, their
+    success rate and its lift over the category's overall success rate.
+    """
+    present = matrix.sign().tocsr()
+    successful = (df['SuccessfulBool'].to_numpy() == 1).astype(np.float64)
+    categories = pd.Categorical(df['category'])
+    valid = np.flatnonzero(categories.codes >= 0)
+    # Category membership as a sparse indicator, so one product counts the
+    # campaigns using every term in every category.
+    membership = sparse.csr_matrix(
+        (np.ones(len(valid)), (categories.codes[valid], valid)),
+        shape=(len(categories.categories), len(categories)))
+    docs_by_category = (membership @ present).tocsr()
+    hits_by_category = (membership.multiply(successful[np.newaxis, :]).tocsr() @ present).tocsr()
+    category_sizes = np.asarray(membership.sum(axis=1)).ravel()
+    category_successes = membership @ successful
+
+    frames = []
+    for code, category in enumerate(categories.categories):
+        docs = docs_by_category[code].toarray().ravel()
+        hits = hits_by_category[code].toarray().ravel()
+        features = np.flatnonzero(docs >= min_docs)
+        if not len(features):
+            continue
+        rate = hits[features] / docs[features]
+        base = category_successes[code] / category_sizes[code]
+        frames.append(pd.DataFrame({
+            'category': category,
+            'feature': features,
+            'docs': docs[features].astype(np.int64),
+            'successes': hits[features].astype(np.int64),
+            'success_rate': rate,
+            'lift': rate / base if base > 0 else np.nan,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['category', 'feature', 'docs', 'successes',
+                                     'success_rate', 'lift'])
+    result = pd.concat(frames, ignore_index=True)
+    if vocabulary is not None:
+        result.insert(2, 'term', result['feature'].map(vocabulary))
+    return result.sort_values(['category', 'lift'], ascending=[True, False],
+                              ignore_index=True)
+
+
+def text_features(df, fields=TEXT_FIELDS, workers=None, cache_dir=TEXT_CACHE_DIR):
+    """``{field: (matrix, vocabulary)}`` for the campaigns of ``df``, through the disk cache."""
+    result = {}
+    for field in fields:
+        cache = TextFeatureCache(field, cache_dir)
+        result[field] = (cache.features(df, workers), cache.vocabulary)
+    return result
@@ -0,0 +1,124 @@
+"""Epoch timestamp columns and vectorized time-series aggregation.
+
+The raw CSV stores ``launched_at``, ``deadline``, ``created_at`` and
+``state_changed_at`` as ``'YYYY-MM-DD HH:MM:SS'`` strings.  ``parse_timestamps``
+parses them once, as the frame is loaded, into int64 seconds since the epoch
+(``<column>_ts``) with Arrow's ``strptime`` kernel and drops the strings, so
+the columnar cache holds plain int64 arrays and no report parses dates again.
+Missing or malformed timestamps become ``MISSING``.
+
+``resample`` buckets campaigns by day, week (starting Monday) or month with
+one ``np.bincount`` per series, and ``rolling_success_rate`` computes trailing
+windows over those buckets from cumulative sums.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+TIMESTAMP_COLUMNS = ['launched_at', 'deadline', 'created_at', 'state_changed_at']
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Epoch value of a missing timestamp (``NaT`` as int64).
+MISSING = np.iinfo(np.int64).min
+
+SECONDS_PER_DAY = 86400
+
+FREQUENCIES = ['D', 'W', 'M']
+
+
+def epoch_column(column):
+    """Name of the epoch-seconds column parsed from ``column``."""
+    return column + '_ts'
+
+
+def epoch_seconds(values):
+    """int64 seconds since the epoch of timestamp strings (``MISSING`` where unparseable)."""
+    strings = pa.array(np.asarray(values, dtype=object), type=pa.string(), from_pandas=True)
+    parsed = pc.strptime(strings, format=TIMESTAMP_FORMAT, unit='s', error_is_null=True)
+    return pc.fill_null(parsed.cast(pa.int64()), MISSING).to_numpy()
+
+
+def parse_timestamps(df):
+    """Replace the timestamp strings of ``df`` by ``<column>_ts`` epoch columns, in place.
+
+    Returns ``df``; columns it does not have are skipped.
+    """
+    for col in TIMESTAMP_COLUMNS:
+        if col in df.columns and df[col].dtype != np.int64:
+            df[epoch_column(col)] = epoch_seconds(df[col])
+            df.drop(columns=[col], inplace=True)
+    return df
+
+
+def epoch_days(df, column='launched_at'):
+    """Day of ``column`` of every row as days since the epoch (``MISSING`` kept)."""
+    if epoch_column(column) in df.columns:
+        seconds = df[epoch_column(column)].to_numpy(dtype=np.int64)
+    else:
+        seconds = epoch_seconds(df[column])
+    return np.where(seconds == MISSING, MISSING, seconds // SECONDS_PER_DAY)
+
+
+def _periods(days, freq):
+    # Period number of each epoch day, and the first day of period numbers.
+    if freq == 'D':
+        return days, lambda periods: periods
+    if freq == 'W':
+        # 1970-01-01 was a Thursday; shift so that weeks start on Monday.
+        return (days + 3) // 7, lambda periods: periods * 7 - 3
+    if freq == 'M':
+        months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        return months, lambda periods: (periods.astype('datetime64[M]')
+                                        .astype('datetime64[D]').astype(np.int64))
+    raise ValueError('unknown frequency %r (expected one of %s)' % (freq, FREQUENCIES))
+
+
+def resample(df, freq='D', column='launched_at', sums=()):
+    """Campaigns per ``freq`` period of ``column``, zero-filled between the first and last.
+
+    The frame is indexed by the first day of each period and has the
+    ``count`` of campaigns, how many were ``successful`` (``SuccessfulBool``)
+    and the sum of every column in ``sums``.  Rows without a timestamp are
+    left out.
+    """
+    days = epoch_days(df, column)
+    known = days != MISSING
+    periods, first_day = _periods(days[known], freq)
+    if len(periods):
+        start = periods.min()
+        offsets = periods - start
+        size = int(offsets.max()) + 1
+    else:
+        start, offsets, size = 0, periods, 0
+    data = {'count': np.bincount(offsets, minlength=size)}
+    if 'SuccessfulBool' in df.columns:
+        successful = df['SuccessfulBool'].to_numpy()[known]
+        data['successful'] = np.bincount(offsets, weights=successful,
+                                         minlength=size).astype(np.int64)
+    for col in sums:
+        data[col] = np.bincount(offsets, weights=df[col].to_numpy(dtype=np.float64)[known],
+                                minlength=size)
+    index = first_day(start + np.arange(size)).astype('datetime64[D]')
+    return pd.DataFrame(data, index=pd.DatetimeIndex(index, name=column))
+
+
+def rolling_sum(values, window):
+    """Trailing sums of ``window`` values (fewer at the start), via one cumulative sum."""
+    totals = np.concatenate([[0], np.cumsum(values)])
+    ends = np.arange(1, len(values) + 1)
+    return totals[ends] - totals[np.maximum(ends - window, 0)]
+
+
+def rolling_success_rate(series, window, min_count=1):
+    """Success rate over the trailing ``window`` periods of a ``resample`` frame.
+
+    Windows with fewer than ``min_count`` campaigns are NaN.
+    """
+    counts = rolling_sum(series['count'].to_numpy(), window)
+    successes = rolling_sum(series['successful'].to_numpy(), window)
+    rate = np.divide(successes, counts, out=np.full(len(counts), np.nan),
+                     where=counts >= max(min_count, 1))
+    return pd.Series(rate, index=series.index, name='success_rate')